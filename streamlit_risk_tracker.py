@@ -5,29 +5,51 @@ v10 - Multi-select checkboxes, PSC defects/detentions from Risk API
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import asyncio
 import websockets
-import json
 from datetime import datetime, timezone, timedelta
 import pandas as pd
+import numpy as np
 import pydeck as pdk
-from collections import defaultdict
+from collections import defaultdict, deque
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Optional, Tuple
 import pickle
+import orjson
 import os
-import math
+import sqlite3
+from contextlib import closing
+from itertools import islice
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 
 st.set_page_config(page_title="Singapore Ship Tracker", page_icon="🚢", layout="wide")
 
 # Constants
 SGT = timezone(timedelta(hours=8))
-STORAGE_FILE = "ship_data_cache.pkl"
-RISK_DATA_FILE = "risk_data_cache.pkl"
-PSC_RISK_FILE = "psc_risk_cache.pkl"
-MMSI_IMO_CACHE_FILE = "mmsi_imo_cache.pkl"
-VESSEL_POSITION_FILE = "vessel_positions_cache.pkl"
+CACHE_DB_FILE = "ship_tracker_cache.db"
+SHIP_STATIC_TABLE = "ship_static"
+RISK_DATA_TABLE = "risk_data"
+PSC_RISK_TABLE = "psc_risk"
+MMSI_IMO_TABLE = "mmsi_imo"
+VESSEL_POSITION_TABLE = "vessel_positions"
+CACHE_TABLES = [SHIP_STATIC_TABLE, RISK_DATA_TABLE, PSC_RISK_TABLE, MMSI_IMO_TABLE, VESSEL_POSITION_TABLE]
+MMSI_IMO_CACHE_MAX = 50000  # MMSI->IMO mappings kept; the least recently used are evicted past this
+SP_REQUESTS_PER_SECOND = 10  # S&P per-account request budget
+SP_MAX_CONCURRENT_REQUESTS = 10
+# JSON and pickle cache files written by earlier versions - imported once into an empty table
+LEGACY_CACHE_FILES = {
+    SHIP_STATIC_TABLE: ("ship_data_cache.json", "ship_data_cache.pkl"),
+    RISK_DATA_TABLE: ("risk_data_cache.json", "risk_data_cache.pkl"),
+    PSC_RISK_TABLE: ("psc_risk_cache.json", "psc_risk_cache.pkl"),
+    MMSI_IMO_TABLE: ("mmsi_imo_cache.json", "mmsi_imo_cache.pkl"),
+    VESSEL_POSITION_TABLE: ("vessel_positions_cache.json", "vessel_positions_cache.pkl")
+}
 
 # AIS vessel type codes
 VESSEL_TYPE_NAMES = {
@@ -38,13 +60,50 @@ VESSEL_TYPE_NAMES = {
     60: "Passenger", 70: "Cargo", 80: "Tanker", 90: "Other"
 }
 
+# Vessel outline as (x, y) multiples of half width and half length
+VESSEL_HULL_TEMPLATE = np.array([(-1, -1), (-1, 0.5), (0, 1), (1, 0.5), (1, -1), (-1, -1)], dtype=float)
+HULL_X = VESSEL_HULL_TEMPLATE[:, 0]
+HULL_Y = VESSEL_HULL_TEMPLATE[:, 1]
+
+DEG_TO_RAD = np.pi / 180.0
+METERS_PER_DEG_LAT = 111320.0
+LAT_SCALE = 1.0 / METERS_PER_DEG_LAT
+POLYGON_CACHE_MAX = 32768  # Polygons kept across reruns, keyed on rounded position/heading/dimensions
+POSITION_STORE_CAPACITY = 4096  # Initial rows in AISTracker's position columns, doubled when full
+AIS_BATCH_SIZE = 256  # Most queued AIS frames processed per consumer pass
+AIS_QUEUE_MAX = 10000  # Most raw AIS frames held between the receiver and the consumer
+# PositionReport fields in set_position order - aisstream sends all of them on every report
+POSITION_REPORT_FIELDS = itemgetter('UserID', 'Latitude', 'Longitude', 'Sog', 'Cog', 'TrueHeading', 'NavigationalStatus')
+
 NAV_STATUS_NAMES = {
     0: "Under way using engine", 1: "At anchor", 2: "Not under command",
     3: "Restricted maneuverability", 4: "Constrained by draught", 5: "Moored",
     6: "Aground", 7: "Engaged in fishing", 8: "Under way sailing", 15: "Not defined"
 }
 
+# Map colours by legal_overall (2 severe, 1 warning, 0 clear) - shared, never mutated
+SHIP_COLORS = {2: [220, 53, 69, 200], 1: [255, 193, 7, 200], 0: [40, 167, 69, 200]}
+UNKNOWN_SHIP_COLOR = [128, 128, 128, 200]
+# Colours and compliance emojis indexed by compliance_level_codes, so unchecked (-1) and unexpected levels share slot 0
+SHIP_COLOR_LUT = np.fromiter([UNKNOWN_SHIP_COLOR, SHIP_COLORS[0], SHIP_COLORS[1], SHIP_COLORS[2]], dtype=object, count=4)
+COMPLIANCE_EMOJI_LUT = np.array(["❓", "🟢", "🟡", "🔴"], dtype=object)
+
+# Vessel dataframe compliance columns and the S&P compliance record fields they come from
+COMPLIANCE_FIELDS = {
+    'un_sanction': 'ship_un_sanction', 'ofac_sanction': 'ship_ofac_sanction',
+    'ofac_non_sdn': 'ship_ofac_non_sdn', 'ofac_advisory': 'ship_ofac_advisory',
+    'port_call_12m': 'port_call_12m', 'dark_activity': 'dark_activity',
+    'sts_partner_non_compliance': 'sts_partner_non_compliance', 'flag_disputed': 'flag_disputed',
+    'flag_sanctioned': 'flag_sanctioned', 'flag_sanctioned_historical': 'flag_sanctioned_historical',
+    'security_legal_dispute': 'security_legal_dispute'
+}
+
 # Helper Functions
+def compliance_level_codes(levels: pd.Series) -> np.ndarray:
+    """Compliance levels as lookup-table indices: level + 1 for 0-2, and 0 for unchecked, missing or unexpected"""
+    codes = levels.to_numpy(dtype=np.int16, na_value=-1) + 1
+    return np.where((codes >= 0) & (codes <= 3), codes, 0)
+
 def format_datetime(dt_string: str) -> str:
     """Format ISO datetime string to readable format"""
     if not dt_string or dt_string in ['Unknown', 'Never']:
@@ -82,40 +141,147 @@ def get_vessel_type_category(type_code: int) -> str:
         return "Other"
     return "Other"
 
-def load_cache() -> Tuple[Dict, Dict, Dict, Dict, Dict]:
-    """Load all cached data from disk"""
-    caches = [{}, {}, {}, {}, {}]
-    files = [STORAGE_FILE, RISK_DATA_FILE, PSC_RISK_FILE, MMSI_IMO_CACHE_FILE, VESSEL_POSITION_FILE]
-    for i, file in enumerate(files):
-        if os.path.exists(file):
+# Category per AIS type code 0-99, with codes above 99 sharing the final "Other" slot
+VESSEL_TYPE_CATEGORIES = np.array([get_vessel_type_category(code) for code in range(100)] + ["Other"], dtype=object)
+
+# Fixed vocabularies for the categorical type_name / nav_status_name columns and their sidebar filters
+VESSEL_TYPE_CATEGORY_NAMES = ["Cargo", "Tanker", "Passenger", "Tug", "Fishing", "High Speed Craft", "Pilot", "SAR",
+                              "Port Tender", "Law Enforcement", "Other", "Unknown"]
+NAV_STATUS_CATEGORIES = list(NAV_STATUS_NAMES.values()) + ["Unknown"]
+
+def open_cache_db(check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open the cache database in WAL mode, creating the key/value tables if needed"""
+    conn = sqlite3.connect(CACHE_DB_FILE, timeout=10, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for table in CACHE_TABLES:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, data BLOB NOT NULL)")
+    return conn
+
+def load_legacy_cache(table: str) -> Dict:
+    """Read a cache table's pre-SQLite file, preferring JSON over pickle - unreadable files load as empty"""
+    for path in LEGACY_CACHE_FILES[table]:
+        if os.path.exists(path):
             try:
-                with open(file, 'rb') as f:
-                    caches[i] = pickle.load(f)
+                with open(path, 'rb') as f:
+                    data = orjson.loads(f.read()) if path.endswith('.json') else pickle.load(f)
+                return {str(k): v for k, v in data.items()}
             except:
-                pass
-    return tuple(caches)
+                return {}
+    return {}
 
-def save_cache(ship_cache: Dict, risk_cache: Dict, mmsi_imo_cache: Dict = None, vessel_positions: Dict = None, psc_risk_cache: Dict = None):
-    """Save all caches to disk"""
+def read_cache_table(conn: sqlite3.Connection, table: str) -> Dict:
+    """Read one cache table back into a dict - an unreadable table loads as empty"""
     try:
-        with open(STORAGE_FILE, 'wb') as f:
-            pickle.dump(ship_cache, f)
-        with open(RISK_DATA_FILE, 'wb') as f:
-            pickle.dump(risk_cache, f)
-        if psc_risk_cache is not None:
-            with open(PSC_RISK_FILE, 'wb') as f:
-                pickle.dump(psc_risk_cache, f)
-        if mmsi_imo_cache is not None:
-            with open(MMSI_IMO_CACHE_FILE, 'wb') as f:
-                pickle.dump(mmsi_imo_cache, f)
-        if vessel_positions is not None:
-            with open(VESSEL_POSITION_FILE, 'wb') as f:
-                pickle.dump(vessel_positions, f)
+        return {key: orjson.loads(data) for key, data in conn.execute(f"SELECT key, data FROM {table}")}
+    except:
+        return {}
+
+def load_cache() -> Tuple[Dict, Dict, Dict, Dict, Dict]:
+    """Load all cached data from disk"""
+    try:
+        with closing(open_cache_db()) as conn:
+            # user_version 0 means the pre-SQLite cache files have not been imported yet
+            if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+                with conn:
+                    for table in CACHE_TABLES:
+                        write_cache_table(conn, table, load_legacy_cache(table))
+                    conn.execute("PRAGMA user_version = 1")
+            return tuple(read_cache_table(conn, table) for table in CACHE_TABLES)
+    except:
+        return tuple({} for _ in CACHE_TABLES)
+
+def serialize_cache_rows(data: Dict, keys=None) -> Tuple[List[Tuple[str, bytes]], Optional[List[str]]]:
+    """Serialize cache entries as (upsert rows, deleted keys) - deleted is None for a whole-table sync"""
+    if keys is None:
+        data = {str(key): value for key, value in data.items()}
+        keys, deleted = list(data), None
+    else:
+        deleted = [str(key) for key in keys if key not in data]
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    return [(str(key), orjson.dumps(data[key], option=option)) for key in keys if key in data], deleted
+
+def write_cache_rows(conn: sqlite3.Connection, table: str, rows: List[Tuple[str, bytes]], deleted: Optional[List[str]] = None):
+    """Upsert serialized rows and delete removed keys - deleted=None removes every key not in rows"""
+    if deleted is None:
+        present = {key for key, _ in rows}
+        deleted = [key for (key,) in conn.execute(f"SELECT key FROM {table}") if key not in present]
+    # Rows whose stored bytes are identical are skipped, so unchanged entries cost no page writes
+    conn.executemany(f"INSERT INTO {table} (key, data) VALUES (?, ?) "
+                     f"ON CONFLICT(key) DO UPDATE SET data = excluded.data WHERE data IS NOT excluded.data", rows)
+    conn.executemany(f"DELETE FROM {table} WHERE key = ?", [(key,) for key in deleted])
+
+def write_cache_table(conn: sqlite3.Connection, table: str, data: Dict, keys=None):
+    """Upsert the given keys of a cache dict, deleting keys no longer in it - keys=None syncs the whole table"""
+    write_cache_rows(conn, table, *serialize_cache_rows(data, keys))
+
+def commit_cache_writes(conn: sqlite3.Connection, writes: List[Tuple[str, List[Tuple[str, bytes]], Optional[List[str]]]]):
+    """Apply serialized (table, rows, deleted) writes in one transaction"""
+    with conn:
+        for table, rows, deleted in writes:
+            write_cache_rows(conn, table, rows, deleted)
+
+@st.cache_resource
+def get_cache_writer() -> ThreadPoolExecutor:
+    """One writer thread per process, so SQLite writes stay ordered and off the callers' threads"""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+
+@st.cache_resource
+def get_cache_writer_db() -> sqlite3.Connection:
+    """The writer thread's connection, opened once per process - only ever used on that one thread"""
+    return open_cache_db(check_same_thread=False)
+
+def mark_cache_dirty(table: str, *keys: str):
+    """Flag cache entries changed since the last save - with no keys the whole table is rewritten"""
+    dirty = st.session_state.setdefault('dirty_caches', {})
+    if not keys:
+        dirty[table] = None
+    elif dirty.get(table, ()) is not None:
+        dirty.setdefault(table, set()).update(keys)
+
+def remember_mmsi_imo(mmsi: str, imo: str):
+    """Record an MMSI->IMO mapping as most recently used - the dict's insertion order is the LRU order,
+    and mappings evicted past MMSI_IMO_CACHE_MAX are deleted from disk on the next save"""
+    cache = st.session_state.mmsi_to_imo_cache
+    cache.pop(mmsi, None)
+    cache[mmsi] = imo
+    if len(cache) > MMSI_IMO_CACHE_MAX:
+        evicted = list(islice(cache, len(cache) - MMSI_IMO_CACHE_MAX))
+        for key in evicted:
+            del cache[key]
+        mark_cache_dirty(MMSI_IMO_TABLE, *evicted)
+
+def save_cache(ship_cache: Dict, risk_cache: Dict, mmsi_imo_cache: Dict = None, vessel_positions: Dict = None,
+               psc_risk_cache: Dict = None, force: bool = False, background: bool = False):
+    """Save caches to disk - only entries flagged dirty are written unless force is set.
+    Entries are serialized here; the disk write runs on the cache writer thread, waited on unless background is set"""
+    dirty = st.session_state.setdefault('dirty_caches', {})
+    previous = st.session_state.get('pending_cache_save')
+    if previous is not None and previous.done():
+        st.session_state.pending_cache_save = None
+        if previous.exception():
+            st.warning(f"Could not save cache: {previous.exception()}")
+    pending = [(table, data) for table, data in [
+        (SHIP_STATIC_TABLE, ship_cache), (RISK_DATA_TABLE, risk_cache), (PSC_RISK_TABLE, psc_risk_cache),
+        (MMSI_IMO_TABLE, mmsi_imo_cache), (VESSEL_POSITION_TABLE, vessel_positions)
+    ] if data is not None and (force or table in dirty)]
+    if not pending:
+        return
+    try:
+        writes = [(table, *serialize_cache_rows(data, None if force else dirty[table])) for table, data in pending]
+        for table, _ in pending:
+            dirty.pop(table, None)
+        future = get_cache_writer().submit(commit_cache_writes, get_cache_writer_db(), writes)
+        if background:
+            st.session_state.pending_cache_save = future
+        else:
+            future.result()
     except Exception as e:
         st.warning(f"Could not save cache: {e}")
 
-def load_maritime_zones(excel_path: str) -> Dict[str, List[Dict]]:
-    """Load maritime zones from Excel file"""
+@st.cache_data(show_spinner=False)
+def load_maritime_zones(excel_path: str, mtime: Optional[float] = None) -> Dict[str, List[Dict]]:
+    """Load maritime zones from Excel file - cached per path and modification time"""
     zones = {"Anchorages": [], "Channels": [], "Fairways": []}
     try:
         sheets = pd.read_excel(excel_path, sheet_name=None)
@@ -126,64 +292,50 @@ def load_maritime_zones(excel_path: str) -> Dict[str, List[Dict]]:
             name_col = next((col for col in df.columns if 'Name' in col), None)
             if name_col is None:
                 continue
-            for zone_name in df[name_col].unique():
-                zone_df = df[df[name_col] == zone_name]
-                if 'Decimal Latitude' in zone_df.columns and 'Decimal Longitude' in zone_df.columns:
-                    coords = [[float(row['Decimal Longitude']), float(row['Decimal Latitude'])]
-                             for _, row in zone_df.iterrows()
-                             if pd.notna(row['Decimal Latitude']) and pd.notna(row['Decimal Longitude'])]
-                    if len(coords) >= 3:
-                        if coords[0] != coords[-1]:
-                            coords.append(coords[0])
-                        zones[sheet_name].append({"name": zone_name, "polygon": coords})
+            if 'Decimal Latitude' not in df.columns or 'Decimal Longitude' not in df.columns:
+                continue
+            points = df[[name_col, 'Decimal Longitude', 'Decimal Latitude']].dropna()
+            for zone_name, zone_df in points.groupby(name_col, sort=False):
+                coords = zone_df[['Decimal Longitude', 'Decimal Latitude']].to_numpy(dtype=float).tolist()
+                if len(coords) >= 3:
+                    if coords[0] != coords[-1]:
+                        coords.append(coords[0])
+                    zones[sheet_name].append({"name": zone_name, "polygon": coords})
         return zones
     except Exception as e:
         st.warning(f"Could not load maritime zones: {e}")
         return zones
 
-def create_vessel_polygon(lat: float, lon: float, heading: float, length: float = 60, 
-                         width: float = 16, dim_a: float = 0, dim_b: float = 0,
-                         dim_c: float = 0, dim_d: float = 0) -> List[List[float]]:
-    """Create vessel-shaped polygon at actual scale"""
-    if lat is None or lon is None:
-        return [[lon or 0, lat or 0]] * 7
-    if heading is None or heading < 0 or heading >= 360:
-        heading = 0
-    heading_rad = math.radians(-heading)
-    
-    if length <= 0 or length > 500:
-        length = 50
-    if width <= 0 or width > 80:
-        width = 10
-    
-    meters_per_deg_lat = 111320.0
-    meters_per_deg_lon = 111320.0 * math.cos(math.radians(lat))
-    
-    offset_forward = ((dim_a - dim_b) / 2.0) if (dim_a > 0 or dim_b > 0) else 0
-    offset_port = ((dim_c - dim_d) / 2.0) if (dim_c > 0 or dim_d > 0) else 0
-    
-    half_length = length / 2.0 / meters_per_deg_lat
-    half_width = width / 2.0 / meters_per_deg_lon
-    offset_fwd_deg = offset_forward / meters_per_deg_lat
-    offset_port_deg = offset_port / meters_per_deg_lon
-    
-    bow_point = half_length
-    bow_start = half_length * 0.5
-    
-    corners_local = [
-        (-half_width, -half_length), (-half_width, bow_start), (0, bow_point),
-        (half_width, bow_start), (half_width, -half_length), (-half_width, -half_length)
-    ]
-    
-    cos_h, sin_h = math.cos(heading_rad), math.sin(heading_rad)
-    rotated_corners = []
-    for d_lon, d_lat in corners_local:
-        d_lat_adj = d_lat - offset_fwd_deg
-        d_lon_adj = d_lon + offset_port_deg
-        rotated_lon = d_lon_adj * cos_h - d_lat_adj * sin_h
-        rotated_lat = d_lon_adj * sin_h + d_lat_adj * cos_h
-        rotated_corners.append([lon + rotated_lon, lat + rotated_lat])
-    return rotated_corners
+def create_vessel_polygons(lats: np.ndarray, lons: np.ndarray, headings: np.ndarray,
+                           lengths: np.ndarray, widths: np.ndarray, dim_a: np.ndarray, dim_b: np.ndarray,
+                           dim_c: np.ndarray, dim_d: np.ndarray) -> np.ndarray:
+    """Create vessel-shaped polygons at actual scale for all vessels at once - returns (N, 6, 2) lon/lat"""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    headings = np.asarray(headings, dtype=float)
+    headings = np.where(np.isnan(headings) | (headings < 0) | (headings >= 360), 0, headings)
+    heading_rad = headings * -DEG_TO_RAD
+    
+    lengths = np.asarray(lengths, dtype=float)
+    widths = np.asarray(widths, dtype=float)
+    lengths = np.where((lengths <= 0) | (lengths > 500), 50, lengths)
+    widths = np.where((widths <= 0) | (widths > 80), 10, widths)
+    
+    # Degrees per metre east-west, computed once per vessel and shared by width and offset
+    lon_scale = 1.0 / (METERS_PER_DEG_LAT * np.cos(lats * DEG_TO_RAD))
+    
+    offset_forward = (np.asarray(dim_a, dtype=float) - np.asarray(dim_b, dtype=float)) * 0.5
+    offset_port = (np.asarray(dim_c, dtype=float) - np.asarray(dim_d, dtype=float)) * 0.5
+    
+    # Hull outline in units of half width/half length: stern corners, bow shoulders, bow point, closed
+    d_lon = (HULL_X * (widths * 0.5)[:, None] + offset_port[:, None]) * lon_scale[:, None]
+    d_lat = (HULL_Y * (lengths * 0.5)[:, None] - offset_forward[:, None]) * LAT_SCALE
+    
+    cos_h, sin_h = np.cos(heading_rad)[:, None], np.sin(heading_rad)[:, None]
+    polygons = np.empty((len(lats), len(VESSEL_HULL_TEMPLATE), 2))
+    polygons[:, :, 0] = lons[:, None] + (d_lon * cos_h - d_lat * sin_h)
+    polygons[:, :, 1] = lats[:, None] + (d_lon * sin_h + d_lat * cos_h)
+    return polygons
 
 # Initialize session state
 if 'ship_static_cache' not in st.session_state:
@@ -194,9 +346,15 @@ if 'ship_static_cache' not in st.session_state:
     st.session_state.mmsi_to_imo_cache = mmsi_imo_cache
     st.session_state.vessel_positions = vessel_positions
     st.session_state.last_save = time.time()
+    st.session_state.dirty_caches = {}
     st.session_state.last_data_update = vessel_positions.get('_last_update', None)
     st.session_state.collection_in_progress = False
 
+if 'polygon_cache' not in st.session_state:
+    st.session_state.polygon_cache = {}
+if 'zone_layer_cache' not in st.session_state:
+    st.session_state.zone_layer_cache = {}
+
 if 'selected_vessels' not in st.session_state:
     st.session_state.selected_vessels = []
 if 'show_details_imo' not in st.session_state:
@@ -204,21 +362,127 @@ if 'show_details_imo' not in st.session_state:
     st.session_state.show_details_name = None
 
 # API Classes
+class RateLimiter:
+    """Thread-safe sliding-window limiter: at most `rate` calls per `per` seconds"""
+    def __init__(self, rate: int, per: float = 1.0):
+        self.rate = rate
+        self.per = per
+        self.calls = deque()
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        """Block until another call fits in the window"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.per:
+                    self.calls.popleft()
+                if len(self.calls) < self.rate:
+                    self.calls.append(now)
+                    return
+                delay = self.per - (now - self.calls[0])
+            time.sleep(delay)
+
+class LookupCoalescer:
+    """Results shared by the sessions that hold one instance - concurrent lookups of one key make a single request.
+    Results expire after ttl and the least recently stored are evicted past max_entries"""
+    def __init__(self, ttl: timedelta, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.inflight: Dict[str, threading.Event] = {}
+        self.results: Dict[str, Tuple[datetime, Optional[Dict]]] = {}
+    
+    def fresh_result(self, key: str) -> Optional[Tuple[datetime, Optional[Dict]]]:
+        """The stored (time, result) for key if still within ttl - expired entries are dropped. Caller holds the lock"""
+        cached = self.results.get(key)
+        if cached and datetime.now(SGT) - cached[0] >= self.ttl:
+            del self.results[key]
+            cached = None
+        return cached
+    
+    def fetch(self, key: str, fetch_fn):
+        """Return a fresh shared result for key, else wait on the in-flight request or make it ourselves"""
+        with self.lock:
+            cached = self.fresh_result(key)
+            if cached:
+                return cached[1]
+            event = self.inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self.inflight[key] = threading.Event()
+        if not owner:
+            event.wait()
+            # The owner's request may have failed - an older entry is only used while still within ttl
+            with self.lock:
+                cached = self.fresh_result(key)
+            return cached[1] if cached else None
+        try:
+            result = fetch_fn(key)
+            if result is not None:
+                with self.lock:
+                    self.results.pop(key, None)
+                    self.results[key] = (datetime.now(SGT), result)
+                    if len(self.results) > self.max_entries:
+                        for evicted in list(islice(self.results, len(self.results) - self.max_entries)):
+                            del self.results[evicted]
+            return result
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            event.set()
+
+@st.cache_resource
+def get_mmsi_lookup_coalescer(username: str) -> LookupCoalescer:
+    """One MMSI lookup coalescer per S&P account per server process, holding only each vessel's IMO and parsed
+    compliance - results bought under one account are never handed to sessions signed in with another"""
+    return LookupCoalescer(SPShipsComplianceAPI.COMPLIANCE_TTL, MMSI_IMO_CACHE_MAX)
+
+@st.cache_resource
+def get_sp_session(username: str, password: str) -> requests.Session:
+    """One keep-alive connection pool per S&P account per server process, so TLS connections outlive a refresh"""
+    session = requests.Session()
+    session.auth = (username, password)
+    # Throttling and gateway errors are retried with backoff; the last response is still returned to the caller
+    retries = Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 502, 503, 504], allowed_methods=["GET"],
+                    raise_on_status=False)
+    session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=SP_MAX_CONCURRENT_REQUESTS * 2,
+                                          max_retries=retries))
+    return session
+
+@st.cache_resource
+def get_sp_rate_limiter(username: str) -> RateLimiter:
+    """The request budget is per S&P account, so every session using the account shares one limiter"""
+    return RateLimiter(SP_REQUESTS_PER_SECOND)
+
 class SPShipsComplianceAPI:
     """S&P Ships API for compliance data and ship details"""
+    # Sanctions lists change daily, so cached compliance is re-fetched once it is a day old
+    COMPLIANCE_TTL = timedelta(hours=24)
+    
     def __init__(self, username: str, password: str):
         self.username = username
         self.password = password
+        self.rate_limiter = get_sp_rate_limiter(username)
+        self.mmsi_lookups = get_mmsi_lookup_coalescer(username)
+        # Shared keep-alive connection pool instead of a new TLS handshake per request
+        self.session = get_sp_session(username, password)
         self.base_url_imo = "https://shipsapi.maritime.spglobal.com/MaritimeWCF/APSShipService.svc/RESTFul/GetShipsByIHSLRorIMONumbersAll"
         self.base_url_mmsi = "https://shipsapi.maritime.spglobal.com/MaritimeWCF/APSShipService.svc/RESTFul/GetShipDataByMMSI"
     
+    def is_fresh(self, compliance: Optional[Dict]) -> bool:
+        """True if a cached compliance entry is younger than COMPLIANCE_TTL"""
+        try:
+            return datetime.now(SGT) - datetime.fromisoformat(compliance['cached_at']) < self.COMPLIANCE_TTL
+        except (KeyError, TypeError, ValueError):
+            return False
+    
     def get_ship_details_by_imo(self, imo: str) -> Optional[Dict]:
         """Get full ship details including dark activity by IMO"""
         try:
-            url = f"{self.base_url_imo}?imoNumbers={imo}"
-            response = requests.get(url, auth=(self.username, self.password), timeout=30)
+            response = self.request_batch(f"{self.base_url_imo}?imoNumbers={imo}")
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if 'ShipResult' in data and data['ShipResult']:
                     ship_result = data['ShipResult'][0] if isinstance(data['ShipResult'], list) else data['ShipResult']
                     if 'APSShipDetail' in ship_result:
@@ -279,21 +543,31 @@ class SPShipsComplianceAPI:
         cache = st.session_state.mmsi_to_imo_cache
         uncached_mmsis = [m for m in mmsi_list if m not in cache or cache.get(m) is None]
         
-        # Return cached IMOs
+        # Return cached IMOs, refreshing their recency
         for mmsi in mmsi_list:
             if mmsi in cache and cache[mmsi] is not None:
                 results[mmsi] = cache[mmsi]
+                remember_mmsi_imo(mmsi, cache[mmsi])
         
         if not uncached_mmsis:
             return results
         
-        # Fetch compliance data for uncached MMSIs (this also caches IMOs)
+        # Fetch compliance data for uncached MMSIs in parallel (this also caches IMOs)
         # This happens silently as it's part of the overall compliance fetching process
-        for mmsi in uncached_mmsis:
-            imo = self.get_imo_by_mmsi(mmsi)
-            if imo:
-                results[mmsi] = imo
+        with ThreadPoolExecutor(max_workers=SP_MAX_CONCURRENT_REQUESTS) as executor:
+            futures = {executor.submit(self.fetch_ship_detail_by_mmsi, mmsi): mmsi for mmsi in uncached_mmsis}
+            for future in as_completed(futures):
+                mmsi = futures[future]
+                try:
+                    compliance = self.cache_ship_detail_for_mmsi(mmsi, future.result())
+                except Exception as e:
+                    st.error(f"⚠️ S&P Ships API error for MMSI {mmsi}: {str(e)}")
+                    continue
+                if compliance:
+                    results[mmsi] = cache[mmsi]
         
+        save_cache(st.session_state.ship_static_cache, st.session_state.risk_data_cache, cache, None,
+                  st.session_state.get('psc_risk_cache', {}))
         return results
     
     def parse_compliance_from_ship_detail(self, ship_detail: Dict) -> Dict:
@@ -317,13 +591,50 @@ class SPShipsComplianceAPI:
             'cached_at': datetime.now(SGT).isoformat()
         }
     
+    def fetch_compliance_batch(self, imo_numbers: List[str]) -> Dict[str, Dict]:
+        """Request and parse compliance for one batch of up to 100 IMOs - IMOs the API did not return are
+        recorded as checked but not found. Touches no session state, so it can run on any thread"""
+        response = self.request_batch(f"{self.base_url_imo}?imoNumbers={','.join(imo_numbers)}")
+        results = {}
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            # Response structure: {"shipCount": 3, "ShipResult": [...]}
+            if 'ShipResult' in data and data['ShipResult']:
+                ship_results = data['ShipResult'] if isinstance(data['ShipResult'], list) else [data['ShipResult']]
+                
+                for ship_result in ship_results:
+                    if 'APSShipDetail' in ship_result:
+                        detail = ship_result['APSShipDetail']
+                        imo = str(detail.get('IHSLRorIMOShipNo', ''))
+                        if imo:
+                            results[imo] = self.parse_compliance_from_ship_detail(detail)
+        
+        # Mark IMOs that weren't returned as checked but not found
+        for imo in imo_numbers:
+            if imo not in results:
+                results[imo] = {
+                    'legal_overall': -1,
+                    'checked_but_not_found': True,
+                    'cached_at': datetime.now(SGT).isoformat()
+                }
+        return results
+    
+    def store_compliance(self, results: Dict[str, Dict]):
+        """Merge screened compliance records into the session cache and save them"""
+        if not results:
+            return
+        st.session_state.risk_data_cache.update(results)
+        mark_cache_dirty(RISK_DATA_TABLE, *results)
+        save_cache(st.session_state.ship_static_cache, st.session_state.risk_data_cache,
+                  None, None, st.session_state.get('psc_risk_cache', {}))
+    
     def get_ship_compliance_by_imo_batch(self, imo_numbers: List[str], status_placeholder=None) -> Dict[str, Dict]:
         """Get compliance data for multiple IMOs (up to 100) in one call"""
         if not imo_numbers:
             return {}
         
         cache = st.session_state.risk_data_cache
-        uncached_imos = [imo for imo in imo_numbers if imo not in cache]
+        uncached_imos = [imo for imo in imo_numbers if not self.is_fresh(cache.get(imo))]
         
         # Use provided status_placeholder or create new one
         info_placeholder = status_placeholder if status_placeholder else st.empty()
@@ -340,47 +651,20 @@ class SPShipsComplianceAPI:
         try:
             # Batch up to 100 IMOs per call
             batches = [uncached_imos[i:i+100] for i in range(0, len(uncached_imos), 100)]
-            received_imos = set()
+            screened = {}
             
-            for batch_idx, batch in enumerate(batches):
-                imo_string = ','.join(batch)
-                url = f"{self.base_url_imo}?imoNumbers={imo_string}"
-                response = requests.get(url, auth=(self.username, self.password), timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    # Response structure: {"shipCount": 3, "ShipResult": [...]}
-                    if 'ShipResult' in data and data['ShipResult']:
-                        ship_results = data['ShipResult'] if isinstance(data['ShipResult'], list) else [data['ShipResult']]
-                        
-                        for ship_result in ship_results:
-                            if 'APSShipDetail' in ship_result:
-                                detail = ship_result['APSShipDetail']
-                                imo = str(detail.get('IHSLRorIMOShipNo', ''))
-                                if imo:
-                                    received_imos.add(imo)
-                                    cache[imo] = self.parse_compliance_from_ship_detail(detail)
-                
-                progress_pct = int(((batch_idx + 1) / len(batches)) * 100)
-                info_placeholder.info(f"🔍 Fetching compliance data for {total_vessels} vessels ({len(uncached_imos)} new)... {progress_pct}%")
-                
-                # Force Streamlit to update the UI
-                if batch_idx < len(batches) - 1:  
-                    time.sleep(0.1)
-                else:
-                    time.sleep(0.5)
-            # Mark IMOs that weren't returned as checked but not found
-            for imo in uncached_imos:
-                if imo not in received_imos:
-                    cache[imo] = {
-                        'legal_overall': -1,
-                        'checked_but_not_found': True,
-                        'cached_at': datetime.now(SGT).isoformat()
-                    }
+            # Batches are requested concurrently and cached together once all have arrived
+            with ThreadPoolExecutor(max_workers=SP_MAX_CONCURRENT_REQUESTS) as executor:
+                futures = [executor.submit(self.fetch_compliance_batch, batch) for batch in batches]
+                for done, future in enumerate(as_completed(futures), 1):
+                    screened.update(future.result())
+                    
+                    progress_pct = int((done / len(batches)) * 100)
+                    info_placeholder.info(f"🔍 Fetching compliance data for {total_vessels} vessels ({len(uncached_imos)} new)... {progress_pct}%")
             
-            st.session_state.risk_data_cache = cache
-            save_cache(st.session_state.ship_static_cache, st.session_state.risk_data_cache,
-                      None, None, st.session_state.get('psc_risk_cache', {}))
+            # Leave the final progress message up briefly
+            time.sleep(0.5)
+            self.store_compliance(screened)
         except Exception as e:
             st.error(f"⚠️ S&P Ships API error: {str(e)}")
         # Don't clear the placeholder here - let it stay visible until new data is displayed
@@ -395,39 +679,58 @@ class SPShipsComplianceAPI:
         cache = st.session_state.risk_data_cache
         mmsi_cache = st.session_state.mmsi_to_imo_cache
         
-        if mmsi in mmsi_cache and mmsi_cache[mmsi] and mmsi_cache[mmsi] in cache:
+        if mmsi in mmsi_cache and mmsi_cache[mmsi] and self.is_fresh(cache.get(mmsi_cache[mmsi])):
             return cache[mmsi_cache[mmsi]]
         
         try:
-            url = f"{self.base_url_mmsi}?mmsi={mmsi}"
-            response = requests.get(url, auth=(self.username, self.password), timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                # Response structure: {"APSShipDetail": {...}, "APSStatus": {...}}
-                if 'APSShipDetail' in data:
-                    detail = data['APSShipDetail']
-                    imo = str(detail.get('IHSLRorIMOShipNo', ''))
-                    
-                    if imo:
-                        # Cache the IMO mapping
-                        mmsi_cache[mmsi] = imo
-                        st.session_state.mmsi_to_imo_cache = mmsi_cache
-                        
-                        # Parse and cache compliance data
-                        compliance = self.parse_compliance_from_ship_detail(detail)
-                        cache[imo] = compliance
-                        st.session_state.risk_data_cache = cache
-                        save_cache(st.session_state.ship_static_cache, cache, mmsi_cache, None,
-                                  st.session_state.get('psc_risk_cache', {}))
-                        return compliance
-            
-            time.sleep(0.1)
+            compliance = self.cache_ship_detail_for_mmsi(mmsi, self.fetch_ship_detail_by_mmsi(mmsi))
+            if compliance:
+                save_cache(st.session_state.ship_static_cache, cache, mmsi_cache, None,
+                          st.session_state.get('psc_risk_cache', {}))
+            return compliance
         except Exception as e:
             st.error(f"⚠️ S&P Ships API error for MMSI {mmsi}: {str(e)}")
         
         return {}
     
+    def request_batch(self, url: str) -> requests.Response:
+        """Rate-limited GET for one batch endpoint call - touches no session state, so safe in worker threads"""
+        self.rate_limiter.wait()
+        return self.session.get(url, timeout=30)
+    
+    def fetch_ship_detail_by_mmsi(self, mmsi: str) -> Optional[Dict]:
+        """Fetch the IMO and compliance for an MMSI, shared with other sessions of the same account looking it up"""
+        return self.mmsi_lookups.fetch(mmsi, self.request_ship_detail_by_mmsi)
+    
+    def request_ship_detail_by_mmsi(self, mmsi: str) -> Optional[Dict]:
+        """Request an MMSI's ship detail and keep only {'imo', 'compliance'} - touches no session state, so safe
+        in worker threads. An MMSI S&P doesn't know gives {}, which is shared like a hit; failed requests give
+        None and are retried"""
+        self.rate_limiter.wait()
+        url = f"{self.base_url_mmsi}?mmsi={mmsi}"
+        response = self.session.get(url, timeout=30)
+        if response.status_code == 200:
+            # Response structure: {"APSShipDetail": {...}, "APSStatus": {...}}
+            detail = orjson.loads(response.content).get('APSShipDetail') or {}
+            imo = str(detail.get('IHSLRorIMOShipNo', ''))
+            if not imo:
+                return {}
+            # compliance keeps the cached_at of this request, however many sessions reuse it
+            return {'imo': imo, 'compliance': self.parse_compliance_from_ship_detail(detail)}
+        return None
+    
+    def cache_ship_detail_for_mmsi(self, mmsi: str, detail: Optional[Dict]) -> Dict:
+        """Cache the MMSI->IMO mapping and compliance data from a shared MMSI lookup result"""
+        imo = detail.get('imo') if detail else None
+        if not imo:
+            return {}
+        remember_mmsi_imo(mmsi, imo)
+        compliance = dict(detail['compliance'])  # Each session gets its own copy of the shared record
+        st.session_state.risk_data_cache[imo] = compliance
+        mark_cache_dirty(MMSI_IMO_TABLE, mmsi)
+        mark_cache_dirty(RISK_DATA_TABLE, imo)
+        return compliance
+    
     def get_risk_indicators_by_imo_batch(self, imo_numbers: List[str], status_placeholder=None) -> Dict[str, Dict]:
         """Get risk indicators for multiple IMOs (up to 100) from Risk API"""
         if not imo_numbers:
@@ -455,46 +758,42 @@ class SPShipsComplianceAPI:
         
         batches = [uncached_imos[i:i+100] for i in range(0, len(uncached_imos), 100)]
         
-        for batch_idx, batch in enumerate(batches):
-            imos_param = ','.join(batch)
-            
-            try:
-                response = requests.get(
-                    f"{risk_api_url}?imos={imos_param}",
-                    auth=(self.username, self.password),
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    risk_data = response.json()
+        with ThreadPoolExecutor(max_workers=SP_MAX_CONCURRENT_REQUESTS) as executor:
+            futures = {executor.submit(self.request_batch, f"{risk_api_url}?imos={','.join(batch)}"): batch_idx
+                       for batch_idx, batch in enumerate(batches)}
+            for done, future in enumerate(as_completed(futures), 1):
+                batch_idx = futures[future]
+                try:
+                    response = future.result()
                     
-                    # risk_data is a list of risk indicators
-                    for item in risk_data:
-                        imo = str(item.get('lrno', ''))
-                        if imo:
-                            psc_def = item.get('pscDefectsNarrative', '')
-                            psc_det = item.get('pscDetentionsNarrative', '')
-                            results[imo] = {
-                                'psc_defects': psc_def,
-                                'psc_detentions': psc_det,
-                                'risk_cached_at': datetime.now(SGT).isoformat()
-                            }
-                elif response.status_code == 422:
-                    # 422 means some IMOs were invalid - continue without failing
-                    st.info(f"ℹ️ Risk API: Some vessels in batch {batch_idx + 1} not found (status 422). PSC data unavailable for these vessels.")
-                else:
-                    st.warning(f"⚠️ Risk API returned status {response.status_code} for batch {batch_idx + 1}. PSC data unavailable for this batch.")
-                
-                # Update progress
-                progress_pct = int(((batch_idx + 1) / len(batches)) * 100)
-                if status_placeholder:
-                    status_placeholder.info(f"🔍 Fetching risk indicators for {total_vessels} vessels ({len(uncached_imos)} new)... {progress_pct}%")
+                    if response.status_code == 200:
+                        risk_data = orjson.loads(response.content)
+                        
+                        # risk_data is a list of risk indicators
+                        for item in risk_data:
+                            imo = str(item.get('lrno', ''))
+                            if imo:
+                                psc_def = item.get('pscDefectsNarrative', '')
+                                psc_det = item.get('pscDetentionsNarrative', '')
+                                results[imo] = {
+                                    'psc_defects': psc_def,
+                                    'psc_detentions': psc_det,
+                                    'risk_cached_at': datetime.now(SGT).isoformat()
+                                }
+                    elif response.status_code == 422:
+                        # 422 means some IMOs were invalid - continue without failing
+                        st.info(f"ℹ️ Risk API: Some vessels in batch {batch_idx + 1} not found (status 422). PSC data unavailable for these vessels.")
+                    else:
+                        st.warning(f"⚠️ Risk API returned status {response.status_code} for batch {batch_idx + 1}. PSC data unavailable for this batch.")
+                    
+                    # Update progress
+                    progress_pct = int((done / len(batches)) * 100)
+                    if status_placeholder:
+                        status_placeholder.info(f"🔍 Fetching risk indicators for {total_vessels} vessels ({len(uncached_imos)} new)... {progress_pct}%")
                 
-                time.sleep(0.2)  # Rate limiting
-            
-            except Exception as e:
-                st.warning(f"⚠️ Risk API error for batch {batch_idx + 1}: {str(e)}")
-                continue
+                except Exception as e:
+                    st.warning(f"⚠️ Risk API error for batch {batch_idx + 1}: {str(e)}")
+                    continue
         
         # Show completion
         if status_placeholder:
@@ -504,87 +803,201 @@ class SPShipsComplianceAPI:
         return results
 
 class AISTracker:
-    """AIS data collection and vessel tracking"""
+    """AIS data collection and vessel tracking - positions are parallel NumPy columns, one row per MMSI"""
+    # Column name -> (dtype, value for missing data)
+    POSITION_COLUMNS = {
+        'lat': (np.float64, np.nan), 'lon': (np.float64, np.nan),
+        'sog': (np.float64, np.nan), 'cog': (np.float64, np.nan),
+        'true_heading': (np.int16, -1), 'nav_status': (np.int16, -1),
+        'ship_name': (object, None), 'timestamp': (object, None), 'last_seen': (object, None),
+    }
+    
     def __init__(self, use_cached_positions: bool = True):
-        self.ships = defaultdict(lambda: {'latest_position': None, 'static_data': None})
+        self.mmsi_index: Dict[str, int] = {}
+        self.mmsis: List[str] = []
+        self.static_data: Dict[str, Dict] = {}
+        self.dirty_mmsis: set = set()  # Vessels updated since the last position save
+        self.reported_imos: List[Tuple[str, Optional[int]]] = []  # New (IMO, AIS type) pairs, for early screening
+        self.reported_imo_set: set = set()  # The same pairs - static rebroadcasts must not grow the list
+        # Bound once - every session_state lookup costs microseconds, far more than the dict access itself
+        self.ship_static_cache: Dict[str, Dict] = st.session_state.ship_static_cache
+        self._reserve(POSITION_STORE_CAPACITY)
         if use_cached_positions and 'vessel_positions' in st.session_state:
             cached = st.session_state.vessel_positions
             for mmsi, data in cached.items():
-                if mmsi != '_last_update':
-                    self.ships[mmsi] = data
-    
-    def get_ship_color(self, legal_overall: int = -1) -> List[int]:
-        """Return color based on compliance status"""
-        colors = {2: [220, 53, 69, 200], 1: [255, 193, 7, 200], 0: [40, 167, 69, 200]}
-        return colors.get(legal_overall, [128, 128, 128, 200])
+                if mmsi == '_last_update':
+                    continue
+                mmsi = str(mmsi)
+                if data.get('static_data'):
+                    self.static_data[mmsi] = data['static_data']
+                pos = data.get('latest_position')
+                if pos:
+                    self.set_position(mmsi, pos.get('latitude'), pos.get('longitude'), pos.get('sog', 0),
+                                      pos.get('cog', 0), pos.get('true_heading', 511), pos.get('nav_status', 15),
+                                      pos.get('ship_name'), pos.get('timestamp'),
+                                      data.get('last_seen', pos.get('timestamp', '')))
+    
+    def _reserve(self, capacity: int):
+        """Grow every position column to `capacity` rows, keeping existing rows"""
+        for name, (dtype, missing) in self.POSITION_COLUMNS.items():
+            column = np.full(capacity, missing, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                column[:len(old)] = old
+            setattr(self, name, column)
+    
+    def _row(self, mmsi: str) -> int:
+        """Row index for an MMSI, appending a new row on first sight"""
+        row = self.mmsi_index.get(mmsi)
+        if row is None:
+            row = len(self.mmsis)
+            if row == len(self.lat):
+                self._reserve(2 * row)
+            self.mmsi_index[mmsi] = row
+            self.mmsis.append(mmsi)
+        return row
+    
+    def set_position(self, mmsi: str, latitude, longitude, sog, cog, true_heading, nav_status,
+                     ship_name: Optional[str], timestamp: Optional[str], last_seen: Optional[str]):
+        """Write one vessel's latest position into its row"""
+        row = self._row(mmsi)
+        self.lat[row] = np.nan if latitude is None else latitude
+        self.lon[row] = np.nan if longitude is None else longitude
+        self.sog[row] = np.nan if sog is None else sog
+        self.cog[row] = np.nan if cog is None else cog
+        self.true_heading[row] = -1 if true_heading is None else true_heading
+        self.nav_status[row] = -1 if nav_status is None else nav_status
+        self.ship_name[row] = ship_name
+        self.timestamp[row] = timestamp
+        self.last_seen[row] = last_seen
+    
+    def position_records(self) -> Dict[str, Dict]:
+        """Per-MMSI records in the vessel position cache format"""
+        records = {mmsi: {'latest_position': None, 'static_data': static} for mmsi, static in self.static_data.items()}
+        n = len(self.mmsis)
+        rows = zip(self.mmsis, self.lat[:n].tolist(), self.lon[:n].tolist(), self.sog[:n].tolist(),
+                   self.cog[:n].tolist(), self.true_heading[:n].tolist(), self.nav_status[:n].tolist(),
+                   self.ship_name[:n], self.timestamp[:n], self.last_seen[:n])
+        for mmsi, lat, lon, sog, cog, true_heading, nav_status, ship_name, timestamp, last_seen in rows:
+            record = records.setdefault(mmsi, {'latest_position': None, 'static_data': None})
+            record['latest_position'] = {
+                'latitude': None if lat != lat else lat, 'longitude': None if lon != lon else lon,
+                'sog': None if sog != sog else sog, 'cog': None if cog != cog else cog,
+                'true_heading': None if true_heading < 0 else true_heading,
+                'nav_status': None if nav_status < 0 else nav_status,
+                'ship_name': ship_name, 'timestamp': timestamp
+            }
+            record['last_seen'] = last_seen
+        return records
     
     def save_positions_to_cache(self):
         """Save current vessel positions"""
-        positions_dict = dict(self.ships)
+        positions_dict = self.position_records()
         positions_dict['_last_update'] = datetime.now(SGT).isoformat()
         st.session_state.vessel_positions = positions_dict
         st.session_state.last_data_update = positions_dict['_last_update']
+        # Only vessels updated by this collection are serialized and written
+        mark_cache_dirty(VESSEL_POSITION_TABLE, '_last_update', *self.dirty_mmsis)
+        self.dirty_mmsis.clear()
         save_cache(st.session_state.ship_static_cache, st.session_state.risk_data_cache,
                   st.session_state.get('mmsi_to_imo_cache', {}), positions_dict,
                   st.session_state.get('psc_risk_cache', {}))
     
-    async def collect_data(self, duration: int = 30, api_key: str = "", bounding_box: List = None):
-        """Collect AIS data from AISStream.io"""
+    async def collect_data(self, duration: int = 30, api_key: str = "", bounding_box: List = None,
+                           stop_event: Optional[threading.Event] = None):
+        """Collect AIS data from AISStream.io until the duration elapses or stop_event is set"""
         if bounding_box is None:
             bounding_box = [[[0.5, 102.0], [2.5, 106.0]]]
         try:
-            async with websockets.connect("wss://stream.aisstream.io/v0/stream") as ws:
+            # AIS messages are small JSON frames: skip permessage-deflate and allow a deep receive queue
+            async with websockets.connect("wss://stream.aisstream.io/v0/stream", max_size=2**20,
+                                          max_queue=512, compression=None) as ws:
                 subscription = {
                     "APIKey": api_key,
                     "BoundingBoxes": bounding_box,
                     "FilterMessageTypes": ["PositionReport", "ShipStaticData"]
                 }
-                await ws.send(json.dumps(subscription))
-                start_time = time.time()
+                await ws.send(orjson.dumps(subscription).decode())  # Subscription must go as a text frame
+                # The loop clock is monotonic, so a wall-clock adjustment cannot stretch or cut the window
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + duration
                 
-                if 'collection_status_placeholder' in st.session_state:
-                    st.session_state.collection_start_time = start_time
-                    st.session_state.collection_duration_seconds = duration
+                # The receiver only queues raw frames; this loop drains them in batches, so bursts are
+                # absorbed by the queue and the deadline is honoured even when the stream goes quiet
+                queue: asyncio.Queue = asyncio.Queue(maxsize=AIS_QUEUE_MAX)
                 
-                async for message_json in ws:
-                    if not st.session_state.get('collection_in_progress', True):
-                        break
-                    elapsed = time.time() - start_time
-                    progress = min(elapsed / duration, 1.0)
-                    
-                    if 'collection_status_placeholder' in st.session_state:
-                        placeholder = st.session_state.collection_status_placeholder
-                        placeholder.info(f'🔄 Collecting AIS data... {int(progress*100)}%')
-                    
-                    if time.time() - start_time > duration:
-                        break
-                    ais_message = json.loads(message_json)
-                    message_type = ais_message.get("MessageType")
-                    if message_type == "PositionReport":
-                        self.process_position(ais_message)
-                    elif message_type == "ShipStaticData":
-                        self.process_static(ais_message)
+                async def receive():
+                    # Text frames are queued as raw bytes - orjson parses them without a str decode first
+                    try:
+                        while True:
+                            message_json = await ws.recv(decode=False)
+                            try:
+                                queue.put_nowait(message_json)
+                            except asyncio.QueueFull:
+                                # The consumer has fallen behind - drop the oldest frame, a newer report supersedes it
+                                queue.get_nowait()
+                                queue.put_nowait(message_json)
+                    except websockets.ConnectionClosedOK:
+                        pass
+                
+                receiver = asyncio.create_task(receive())
+                try:
+                    while not (stop_event is not None and stop_event.is_set()):
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            batch = [await asyncio.wait_for(queue.get(), min(remaining, 1.0))]
+                        except asyncio.TimeoutError:
+                            if receiver.done():
+                                break
+                            continue
+                        while len(batch) < AIS_BATCH_SIZE and not queue.empty():
+                            batch.append(queue.get_nowait())
+                        self.process_messages(batch)
+                finally:
+                    receiver.cancel()
+                    await asyncio.gather(receiver, return_exceptions=True)
+                if receiver.done() and not receiver.cancelled() and receiver.exception():
+                    raise receiver.exception()
             self.save_positions_to_cache()
         except Exception as e:
             st.error(f"AIS connection error: {e}")
     
-    def process_position(self, ais_message: Dict):
+    def process_messages(self, batch: List):
+        """Decode and apply a batch of raw AIS frames"""
+        # One receive timestamp per batch - formatting it per frame cost more than parsing the frame
+        now = datetime.now(SGT).isoformat()
+        for message_json in batch:
+            ais_message = orjson.loads(message_json)
+            message_type = ais_message.get("MessageType")
+            if message_type == "PositionReport":
+                self.process_position(ais_message, now)
+            elif message_type == "ShipStaticData":
+                self.process_static(ais_message)
+        if time.time() - st.session_state.last_save > 60:
+            # Runs inside the websocket loop - hand the disk write to the cache writer thread
+            save_cache(self.ship_static_cache, st.session_state.risk_data_cache,
+                      None, None, st.session_state.get('psc_risk_cache', {}), background=True)
+            st.session_state.last_save = time.time()
+    
+    def process_position(self, ais_message: Dict, now: Optional[str] = None):
         """Process AIS position report"""
         position_data = ais_message.get('Message', {}).get('PositionReport', {})
-        mmsi = position_data.get('UserID')
+        try:
+            mmsi, *fields = POSITION_REPORT_FIELDS(position_data)
+        except KeyError:
+            # Partial report - fill the missing fields with their "not available" defaults
+            mmsi = position_data.get('UserID')
+            fields = [position_data.get('Latitude'), position_data.get('Longitude'),
+                      position_data.get('Sog', 0), position_data.get('Cog', 0),
+                      position_data.get('TrueHeading', 511), position_data.get('NavigationalStatus', 15)]
         if not mmsi:
             return
-        self.ships[mmsi]['latest_position'] = {
-            'latitude': position_data.get('Latitude'),
-            'longitude': position_data.get('Longitude'),
-            'sog': position_data.get('Sog', 0),
-            'cog': position_data.get('Cog', 0),
-            'true_heading': position_data.get('TrueHeading', 511),
-            'nav_status': position_data.get('NavigationalStatus', 15),
-            'ship_name': ais_message.get('MetaData', {}).get('ShipName', 'Unknown'),
-            'timestamp': datetime.now(SGT).isoformat()
-        }
-        self.ships[mmsi]['last_seen'] = datetime.now(SGT).isoformat()
+        now = now or datetime.now(SGT).isoformat()
+        mmsi = str(mmsi)
+        self.dirty_mmsis.add(mmsi)
+        self.set_position(mmsi, *fields, ais_message.get('MetaData', {}).get('ShipName', 'Unknown'), now, now)
     
     def process_static(self, ais_message: Dict):
         """Process AIS static data report"""
@@ -592,12 +1005,13 @@ class AISTracker:
         mmsi = static_data.get('UserID')
         if not mmsi:
             return
+        mmsi = str(mmsi)
         dimension = static_data.get('Dimension', {})
         imo = str(static_data.get('ImoNumber', 0))
         dim_a, dim_b = dimension.get('A', 0) or 0, dimension.get('B', 0) or 0
         dim_c, dim_d = dimension.get('C', 0) or 0, dimension.get('D', 0) or 0
         
-        existing_cached = st.session_state.ship_static_cache.get(str(mmsi), {})
+        existing_cached = self.ship_static_cache.get(mmsi, {})
         if dim_a == 0 and dim_b == 0:
             dim_a, dim_b = existing_cached.get('dimension_a', 0) or 0, existing_cached.get('dimension_b', 0) or 0
         if dim_c == 0 and dim_d == 0:
@@ -615,247 +1029,229 @@ class AISTracker:
             'call_sign': static_data.get('CallSign', '') or existing_cached.get('call_sign', ''),
             'cached_at': datetime.now(SGT).isoformat()
         }
-        self.ships[mmsi]['static_data'] = static_info
-        st.session_state.ship_static_cache[str(mmsi)] = static_info
-        if time.time() - st.session_state.last_save > 60:
-            save_cache(st.session_state.ship_static_cache, st.session_state.risk_data_cache,
-                      None, None, st.session_state.get('psc_risk_cache', {}))
-            st.session_state.last_save = time.time()
+        self.static_data[mmsi] = static_info
+        self.dirty_mmsis.add(mmsi)
+        report = (imo, static_info['type'])
+        if imo != '0' and report not in self.reported_imo_set:
+            self.reported_imo_set.add(report)
+            self.reported_imos.append(report)
+        self.ship_static_cache[mmsi] = static_info
+        # Vessels rebroadcast identical static data every few minutes - only new content needs saving
+        if {**existing_cached, 'cached_at': None} != {**static_info, 'cached_at': None}:
+            mark_cache_dirty(SHIP_STATIC_TABLE, mmsi)
     
     def get_dataframe_with_compliance(self, sp_api: Optional[SPShipsComplianceAPI] = None, 
-                                     expiry_hours: Optional[int] = None, status_placeholder=None) -> pd.DataFrame:
-        """Get dataframe with compliance indicators"""
-        data = []
-        now = datetime.now(SGT)
+                                     expiry_hours: Optional[int] = None, status_placeholder=None,
+                                     bounding_box: Optional[List] = None, selected_types=None,
+                                     selected_nav_statuses=None) -> pd.DataFrame:
+        """Get dataframe with compliance indicators, optionally only for vessels inside the bounding boxes
+        and matching the type/nav status filters - both are applied before any compliance lookups"""
+        n = len(self.mmsis)
+        keep = ~(np.isnan(self.lat[:n]) | np.isnan(self.lon[:n]))
+        if bounding_box:
+            # Vessels cached from a wider coverage area are dropped before any compliance lookups
+            lat, lon = self.lat[:n], self.lon[:n]
+            in_any_box = np.zeros(n, dtype=bool)
+            for (lat_a, lon_a), (lat_b, lon_b) in bounding_box:
+                in_any_box |= ((lat >= min(lat_a, lat_b)) & (lat <= max(lat_a, lat_b)) &
+                               (lon >= min(lon_a, lon_b)) & (lon <= max(lon_a, lon_b)))
+            keep &= in_any_box
+        if expiry_hours is not None:
+            # Unparseable or missing timestamps are kept, as before
+            last_seen = pd.to_datetime(pd.Series(self.last_seen[:n], dtype=object), errors='coerce',
+                                       format='ISO8601', utc=True)
+            age_hours = (pd.Timestamp.now(tz='UTC') - last_seen).dt.total_seconds() / 3600
+            keep &= ~(age_hours > expiry_hours).to_numpy()
+        rows = np.flatnonzero(keep)
+        if len(rows) == 0:
+            return pd.DataFrame()
         
-        for mmsi, ship_data in self.ships.items():
-            pos = ship_data.get('latest_position')
-            if expiry_hours is not None:
-                last_seen_str = ship_data.get('last_seen')
-                if last_seen_str:
-                    try:
-                        last_seen = datetime.fromisoformat(last_seen_str)
-                        if (now - last_seen).total_seconds() / 3600 > expiry_hours:
-                            continue
-                    except:
-                        pass
-            
-            static = ship_data.get('static_data') or st.session_state.ship_static_cache.get(str(mmsi), {})
-            if not pos or pos.get('latitude') is None or pos.get('longitude') is None:
-                continue
-            
-            name = (static.get('name') or pos.get('ship_name') or 'Unknown').strip()
-            ship_type = static.get('type')
-            imo = str(static.get('imo', '0'))
-            true_heading = pos.get('true_heading', 511)
-            heading = pos.get('cog', 0) if true_heading == 511 else true_heading
-            
-            dim_a, dim_b = static.get('dimension_a', 0) or 0, static.get('dimension_b', 0) or 0
-            dim_c, dim_d = static.get('dimension_c', 0) or 0, static.get('dimension_d', 0) or 0
-            length, width = dim_a + dim_b, dim_c + dim_d
-            has_real_dimensions = (length > 0 and width > 0)
-            if not has_real_dimensions:
-                length, width = 50, 10
-            
-            data.append({
-                'mmsi': mmsi, 'name': name, 'imo': imo,
-                'latitude': pos.get('latitude'), 'longitude': pos.get('longitude'),
-                'speed': pos.get('sog', 0), 'course': pos.get('cog', 0), 'heading': heading,
-                'nav_status': pos.get('nav_status', 15),
-                'nav_status_name': NAV_STATUS_NAMES.get(pos.get('nav_status', 15), 'Unknown'),
-                'type': ship_type, 'type_name': get_vessel_type_category(ship_type),
-                'length': length, 'width': width,
-                'dim_a': dim_a, 'dim_b': dim_b, 'dim_c': dim_c, 'dim_d': dim_d,
-                'has_dimensions': has_real_dimensions,
-                'destination': (static.get('destination') or 'Unknown').strip(),
-                'call_sign': static.get('call_sign', ''),
-                'has_static': bool(static.get('name')),
-                'last_seen': ship_data.get('last_seen', pos.get('timestamp', '')),
-                'sp_ship_type': '', 'sp_flag': '', 'sp_status': '',
-                'legal_overall': -1, 'un_sanction': -1, 'ofac_sanction': -1, 'ofac_non_sdn': -1,
-                'ofac_advisory': -1, 'port_call_12m': -1, 'dark_activity': -1,
-                'sts_partner_non_compliance': -1, 'flag_disputed': -1, 'flag_sanctioned': -1,
-                'flag_sanctioned_historical': -1, 'security_legal_dispute': -1,
-                'psc_defects': '', 'psc_detentions': '',
-                'compliance_checked': False,
-                'color': self.get_ship_color(-1)
-            })
+        mmsis = [self.mmsis[row] for row in rows]
+        columns = defaultdict(list)
+        ship_static_cache = st.session_state.ship_static_cache
+        for mmsi, ship_name in zip(mmsis, self.ship_name[rows]):
+            static = self.static_data.get(mmsi) or ship_static_cache.get(mmsi, {})
+            columns['name'].append((static.get('name') or ship_name or 'Unknown').strip())
+            columns['imo'].append(str(static.get('imo', '0')))
+            columns['type'].append(static.get('type'))
+            columns['dim_a'].append(static.get('dimension_a', 0) or 0)
+            columns['dim_b'].append(static.get('dimension_b', 0) or 0)
+            columns['dim_c'].append(static.get('dimension_c', 0) or 0)
+            columns['dim_d'].append(static.get('dimension_d', 0) or 0)
+            columns['destination'].append((static.get('destination') or 'Unknown').strip())
+            columns['call_sign'].append(static.get('call_sign', ''))
+            columns['has_static'].append(bool(static.get('name')))
         
-        df = pd.DataFrame(data)
-        if len(df) == 0:
-            return df
+        true_heading = self.true_heading[rows]
+        cog = self.cog[rows]
+        df = pd.DataFrame({
+            'mmsi': mmsis, 'name': columns['name'], 'imo': columns['imo'],
+            'latitude': self.lat[rows], 'longitude': self.lon[rows],
+            'speed': self.sog[rows].astype(np.float32), 'course': cog.astype(np.float32),
+            'heading': np.where(true_heading == 511, cog, np.where(true_heading < 0, np.nan, true_heading)).astype(np.float32),
+            'nav_status': self.nav_status[rows].astype(np.int64), 'type': columns['type'],
+            'dim_a': columns['dim_a'], 'dim_b': columns['dim_b'], 'dim_c': columns['dim_c'], 'dim_d': columns['dim_d'],
+            'destination': columns['destination'], 'call_sign': columns['call_sign'],
+            'has_static': columns['has_static'], 'last_seen': self.last_seen[rows]
+        })
         
-        valid_imos = [str(imo) for imo in df['imo'].unique() if imo and imo != '0']
+        type_codes = pd.to_numeric(df['type'], errors='coerce')
+        type_names = VESSEL_TYPE_CATEGORIES[type_codes.fillna(0).to_numpy(dtype=np.int64).clip(0, 100)]
+        df['type_name'] = pd.Categorical(np.where(type_codes.isna(), 'Unknown', type_names),
+                                         categories=VESSEL_TYPE_CATEGORY_NAMES)
+        df['nav_status_name'] = pd.Categorical(df['nav_status'].map(NAV_STATUS_NAMES).fillna('Unknown'),
+                                               categories=NAV_STATUS_CATEGORIES)
+        
+        # Vessels the type/nav status filters would drop are never sent to the S&P API
+        prefilter = filter_mask(df, None, None, selected_types, selected_nav_statuses)
+        if prefilter is not None:
+            df = df[prefilter].reset_index(drop=True)
+        
+        # Vessels without real dimensions are drawn at a default 50m x 10m
+        length = df['dim_a'] + df['dim_b']
+        width = df['dim_c'] + df['dim_d']
+        df['has_dimensions'] = (length > 0) & (width > 0)
+        df['length'] = length.where(df['has_dimensions'], 50)
+        df['width'] = width.where(df['has_dimensions'], 10)
+        
+        df['sp_ship_type'] = ''
+        df['sp_flag'] = ''
+        df['sp_status'] = ''
+        df['legal_overall'] = -1
+        df[list(COMPLIANCE_FIELDS)] = -1
+        df['psc_defects'] = ''
+        df['psc_detentions'] = ''
+        df['compliance_checked'] = False
+        
+        # One entry per IMO, however many vessels report it - insertion-ordered for stable batches
+        valid_imos = dict.fromkeys(str(imo) for imo in df['imo'].unique() if imo and imo != '0')
         missing_imo_mask = (df['imo'] == '0') | (df['imo'] == '')
         missing_imo_mmsis = df.loc[missing_imo_mask, 'mmsi'].astype(str).unique().tolist()
         
-        if missing_imo_mmsis and sp_api:
-            mmsi_to_imo = sp_api.batch_get_imo_by_mmsi(missing_imo_mmsis)
-            for idx, row in df.iterrows():
-                if str(row['mmsi']) in mmsi_to_imo and mmsi_to_imo[str(row['mmsi'])]:
-                    found_imo = mmsi_to_imo[str(row['mmsi'])]
-                    df.at[idx, 'imo'] = found_imo
-                    if found_imo not in valid_imos:
-                        valid_imos.append(found_imo)
-        elif missing_imo_mmsis and not sp_api:
-            cache = st.session_state.get('mmsi_to_imo_cache', {})
-            for idx, row in df.iterrows():
-                mmsi_str = str(row['mmsi'])
-                if mmsi_str in cache and cache[mmsi_str]:
-                    found_imo = cache[mmsi_str]
-                    df.at[idx, 'imo'] = found_imo
-                    if found_imo not in valid_imos:
-                        valid_imos.append(found_imo)
+        if missing_imo_mmsis:
+            if sp_api:
+                mmsi_to_imo = sp_api.batch_get_imo_by_mmsi(missing_imo_mmsis)
+            else:
+                mmsi_to_imo = st.session_state.get('mmsi_to_imo_cache', {})
+            found_imos = df['mmsi'].astype(str).map(lambda m: mmsi_to_imo.get(m) or None)
+            df['imo'] = found_imos.fillna(df['imo'])
+            valid_imos.update(dict.fromkeys(found_imos.dropna().unique()))
         
         compliance_cache = st.session_state.get('risk_data_cache', {})
         psc_cache = st.session_state.get('psc_risk_cache', {})  # Separate cache for PSC data
         
         if valid_imos and sp_api:
-            # Use batch IMO lookup - pass status_placeholder for progress updates
-            compliance_data = sp_api.get_ship_compliance_by_imo_batch(valid_imos, status_placeholder)
+            # Only IMOs missing from the session caches (or stale) go to the API; the rest are served as-is
+            unscreened_imos = [imo for imo in valid_imos if not sp_api.is_fresh(compliance_cache.get(imo))]
+            if unscreened_imos:
+                # Use batch IMO lookup - pass status_placeholder for progress updates
+                sp_api.get_ship_compliance_by_imo_batch(unscreened_imos, status_placeholder)
+                compliance_cache = st.session_state.risk_data_cache
             
-            # Fetch Risk API data (PSC defects/detentions) for all valid IMOs
-            risk_data = sp_api.get_risk_indicators_by_imo_batch(valid_imos, status_placeholder)
+            # Fetch Risk API data (PSC defects/detentions) for IMOs without cached PSC data
+            unrated_imos = [imo for imo in valid_imos if imo not in psc_cache]
+            new_risk_data = sp_api.get_risk_indicators_by_imo_batch(unrated_imos, status_placeholder) if unrated_imos else {}
             
             # Cache the PSC risk data for later use
-            if risk_data:
-                psc_cache.update(risk_data)
+            if new_risk_data:
+                psc_cache.update(new_risk_data)
                 st.session_state.psc_risk_cache = psc_cache
-        else:
-            # Use cached data when sp_api is None (displaying cached vessels)
-            compliance_data = {imo: compliance_cache.get(imo, {}) for imo in valid_imos}
-            risk_data = {imo: psc_cache.get(imo, {}) for imo in valid_imos if imo in psc_cache}
+                mark_cache_dirty(PSC_RISK_TABLE, *new_risk_data)
+        risk_data = {imo: psc_cache[imo] for imo in valid_imos if imo in psc_cache}
         
-        for idx, row in df.iterrows():
-            imo = str(row['imo'])
+        # Apply compliance data (new, or cached for vessels seen before) with one join per IMO
+        compliance_records = {imo: compliance_cache[imo] for imo in df['imo'].unique() if compliance_cache.get(imo)}
+        if compliance_records:
+            comp_df = pd.DataFrame.from_dict(compliance_records, orient='index')
+            comp_df = comp_df.reindex(columns=['sp_ship_type', 'sp_flag', 'sp_status', 'legal_overall']
+                                      + list(COMPLIANCE_FIELDS.values()))
+            joined = df[['imo']].join(comp_df, on='imo')
+            checked = df['imo'].isin(comp_df.index).to_numpy()
             
-            # Apply compliance data (new or cached)
-            if imo in compliance_data and compliance_data[imo]:
-                comp = compliance_data[imo]
-                legal_overall = comp.get('legal_overall', -1)
-                if isinstance(legal_overall, str):
-                    legal_overall = int(legal_overall) if legal_overall.isdigit() else -1
-                
-                df.at[idx, 'sp_ship_type'] = comp.get('sp_ship_type', '')
-                df.at[idx, 'sp_flag'] = comp.get('sp_flag', '')
-                df.at[idx, 'sp_status'] = comp.get('sp_status', '')
-                df.at[idx, 'legal_overall'] = legal_overall
-                df.at[idx, 'un_sanction'] = int(comp.get('ship_un_sanction', 0) or 0)
-                df.at[idx, 'ofac_sanction'] = int(comp.get('ship_ofac_sanction', 0) or 0)
-                df.at[idx, 'ofac_non_sdn'] = int(comp.get('ship_ofac_non_sdn', 0) or 0)
-                df.at[idx, 'ofac_advisory'] = int(comp.get('ship_ofac_advisory', 0) or 0)
-                df.at[idx, 'port_call_12m'] = int(comp.get('port_call_12m', 0) or 0)
-                df.at[idx, 'dark_activity'] = int(comp.get('dark_activity', 0) or 0)
-                df.at[idx, 'sts_partner_non_compliance'] = int(comp.get('sts_partner_non_compliance', 0) or 0)
-                df.at[idx, 'flag_disputed'] = int(comp.get('flag_disputed', 0) or 0)
-                df.at[idx, 'flag_sanctioned'] = int(comp.get('flag_sanctioned', 0) or 0)
-                df.at[idx, 'flag_sanctioned_historical'] = int(comp.get('flag_sanctioned_historical', 0) or 0)
-                df.at[idx, 'security_legal_dispute'] = int(comp.get('security_legal_dispute', 0) or 0)
-                df.at[idx, 'compliance_checked'] = True
-                df.at[idx, 'color'] = self.get_ship_color(legal_overall)
-            elif imo in compliance_cache and compliance_cache[imo]:
-                # Use cached data for vessels that have disappeared from AIS but were seen before
-                comp = compliance_cache[imo]
-                legal_overall = comp.get('legal_overall', -1)
-                if isinstance(legal_overall, str):
-                    legal_overall = int(legal_overall) if legal_overall.isdigit() else -1
-                
-                # Preserve S&P ship details from cache
-                df.at[idx, 'sp_ship_type'] = comp.get('sp_ship_type', '')
-                df.at[idx, 'sp_flag'] = comp.get('sp_flag', '')
-                df.at[idx, 'sp_status'] = comp.get('sp_status', '')
-                df.at[idx, 'legal_overall'] = legal_overall
-                df.at[idx, 'un_sanction'] = int(comp.get('ship_un_sanction', 0) or 0)
-                df.at[idx, 'ofac_sanction'] = int(comp.get('ship_ofac_sanction', 0) or 0)
-                df.at[idx, 'ofac_non_sdn'] = int(comp.get('ship_ofac_non_sdn', 0) or 0)
-                df.at[idx, 'ofac_advisory'] = int(comp.get('ship_ofac_advisory', 0) or 0)
-                df.at[idx, 'port_call_12m'] = int(comp.get('port_call_12m', 0) or 0)
-                df.at[idx, 'dark_activity'] = int(comp.get('dark_activity', 0) or 0)
-                df.at[idx, 'sts_partner_non_compliance'] = int(comp.get('sts_partner_non_compliance', 0) or 0)
-                df.at[idx, 'flag_disputed'] = int(comp.get('flag_disputed', 0) or 0)
-                df.at[idx, 'flag_sanctioned'] = int(comp.get('flag_sanctioned', 0) or 0)
-                df.at[idx, 'flag_sanctioned_historical'] = int(comp.get('flag_sanctioned_historical', 0) or 0)
-                df.at[idx, 'security_legal_dispute'] = int(comp.get('security_legal_dispute', 0) or 0)
-                df.at[idx, 'compliance_checked'] = True
-                df.at[idx, 'color'] = self.get_ship_color(legal_overall)
-            
-            # Apply Risk API data (PSC defects/detentions)
-            if imo in risk_data and risk_data[imo]:
-                risk = risk_data[imo]
-                df.at[idx, 'psc_defects'] = risk.get('psc_defects', '')
-                df.at[idx, 'psc_detentions'] = risk.get('psc_detentions', '')
+            # Assign whole column blocks at once - vessels without compliance data keep the defaults
+            sp_cols = ['sp_ship_type', 'sp_flag', 'sp_status']
+            df[sp_cols] = np.where(checked[:, None], joined[sp_cols].fillna('').to_numpy(), '')
+            legal_overall = pd.to_numeric(joined['legal_overall'], errors='coerce').fillna(-1).astype(int)
+            df['legal_overall'] = np.where(checked, legal_overall.to_numpy(), -1)
+            flags = joined[list(COMPLIANCE_FIELDS.values())].apply(pd.to_numeric, errors='coerce')
+            df[list(COMPLIANCE_FIELDS)] = np.where(checked[:, None], flags.fillna(0).astype(int).to_numpy(), -1)
+            df['compliance_checked'] = checked
+        
+        # Compliance levels are -1..2 - one byte per value instead of eight
+        level_cols = ['legal_overall'] + list(COMPLIANCE_FIELDS)
+        df[level_cols] = df[level_cols].astype(np.int8)
+        
+        # One gather of the shared colour lists instead of a dict lookup per vessel
+        df['color'] = SHIP_COLOR_LUT[compliance_level_codes(df['legal_overall'])]
+        
+        # Apply Risk API data (PSC defects/detentions)
+        psc_records = {imo: risk for imo, risk in risk_data.items() if risk}
+        if psc_records:
+            has_psc = df['imo'].isin(psc_records.keys())
+            for col in ('psc_defects', 'psc_detentions'):
+                values = df['imo'].map({imo: risk.get(col, '') for imo, risk in psc_records.items()})
+                df[col] = values.where(has_psc, df[col])
         
         return df
 
-def create_vessel_layers(df: pd.DataFrame, zoom: float = 10, display_mode: str = "Dots") -> List[pdk.Layer]:
-    """Create PyDeck layers for vessels - user-selectable display mode"""
+def create_vessel_layers(df: pd.DataFrame, zoom: float = 10, display_mode: str = "Dots",
+                         polygon_cache: Optional[Dict] = None) -> List[pdk.Layer]:
+    """Create PyDeck layers for vessels - user-selectable display mode, reusing cached polygons if given"""
     if len(df) == 0:
         return []
     
     layers = []
-    vessel_data = []
-    
-    for _, row in df.iterrows():
-        vessel_length = row['length'] if 0 < row['length'] < 500 else 50
-        vessel_width = row['width'] if 0 < row['width'] < 80 else 10
-        
-        legal_emoji = {2: '🔴', 1: '🟡', 0: '🟢'}.get(row['legal_overall'], '❓')
-        dim_text = f"{vessel_length:.0f}m x {vessel_width:.0f}m" + ("" if row['has_dimensions'] else " (est.)")
-        
-        # Format last seen time
-        last_seen_text = format_datetime(row['last_seen']) if row['last_seen'] else 'Unknown'
-        
-        # Format IMO - show blank if 0
-        imo_display = row['imo'] if row['imo'] != '0' and row['imo'] != 0 else ''
-        
-        tooltip_text = (
-            f"<b>{row['name']}</b><br/>"
-            f"IMO: {imo_display}<br/>MMSI: {row['mmsi']}<br/>"
-            f"Type: {row['type_name']}<br/>Size: {dim_text}<br/>"
-            f"Heading: {row['heading']:.0f}°<br/>Speed: {row['speed']:.1f} kts<br/>"
-            f"Nav Status: {row['nav_status_name']}<br/>"
-            f"Dest: {row['destination']}<br/>"
-            f"Last Seen: {last_seen_text}<br/>Legal Overall: {legal_emoji}"
-        )
-        
-        vessel_data.append({
-            'latitude': row['latitude'], 'longitude': row['longitude'],
-            'name': row['name'], 'tooltip': tooltip_text, 'color': row['color'],
-            'heading': row['heading'], 'length': vessel_length, 'width': vessel_width,
-            'dim_a': row.get('dim_a', 0) or 0, 'dim_b': row.get('dim_b', 0) or 0,
-            'dim_c': row.get('dim_c', 0) or 0, 'dim_d': row.get('dim_d', 0) or 0,
-        })
+    lengths = df['length'].where((df['length'] > 0) & (df['length'] < 500), 50)
+    widths = df['width'].where((df['width'] > 0) & (df['width'] < 80), 10)
+    
+    dim_text = (lengths.map('{:.0f}'.format) + 'm x ' + widths.map('{:.0f}'.format) + 'm'
+                + np.where(df['has_dimensions'], '', ' (est.)'))
+    last_seen_text = df['last_seen'].map(lambda ts: format_datetime(ts) if ts else 'Unknown')
+    imo_display = df['imo'].where((df['imo'] != '0') & (df['imo'] != 0), '').astype(str)
+    legal_emoji = compliance_emojis(df['legal_overall'])
+    
+    tooltips = (
+        '<b>' + df['name'].astype(str) + '</b><br/>'
+        + 'IMO: ' + imo_display + '<br/>MMSI: ' + df['mmsi'].astype(str) + '<br/>'
+        + 'Type: ' + df['type_name'].astype(str) + '<br/>Size: ' + dim_text + '<br/>'
+        + 'Heading: ' + df['heading'].map('{:.0f}'.format) + '°<br/>Speed: ' + df['speed'].map('{:.1f}'.format) + ' kts<br/>'
+        + 'Nav Status: ' + df['nav_status_name'].astype(str) + '<br/>'
+        + 'Dest: ' + df['destination'].astype(str) + '<br/>'
+        + 'Last Seen: ' + last_seen_text + '<br/>Legal Overall: ' + legal_emoji
+    )
     
     if display_mode == "Dots":
         layers.append(pdk.Layer(
-            'ScatterplotLayer', data=vessel_data,
+            'ScatterplotLayer',
+            data=pd.DataFrame({'latitude': df['latitude'], 'longitude': df['longitude'], 'name': df['name'],
+                               'tooltip': tooltips, 'color': df['color']}),
             get_position=['longitude', 'latitude'], get_fill_color='color',
             get_radius=150, radius_min_pixels=3, radius_max_pixels=8,
             pickable=True, auto_highlight=True
         ))
     else:  # "Shapes"
-        vessel_polygons = []
-        for v in vessel_data:
-            polygon = create_vessel_polygon(
-                lat=v['latitude'], lon=v['longitude'], heading=v['heading'],
-                length=v['length'], width=v['width'],
-                dim_a=v['dim_a'], dim_b=v['dim_b'], dim_c=v['dim_c'], dim_d=v['dim_d']
-            )
-            # Calculate realistic 3D height based on actual vessel air draft (height above water)
-            # Typical cargo ships: 30-35m, Large container ships: 40-50m, Cruise ships: 60-75m
-            # Use vessel length as proxy: small (50m) = 20m tall, medium (150m) = 35m tall, large (300m+) = 50m tall
-            if v['length'] < 100:
-                elevation = 20  # Small vessels: ~20m air draft
-            elif v['length'] < 200:
-                elevation = 35  # Medium vessels: ~35m air draft
-            else:
-                elevation = 50  # Large vessels: ~50m air draft
-            
-            vessel_polygons.append({
-                'polygon': polygon, 'name': v['name'], 
-                'tooltip': v['tooltip'], 'color': v['color'],
-                'elevation': elevation
-            })
+        # Stationary and anchored vessels hit the cache on every refresh; only new keys are computed
+        if polygon_cache is None:
+            polygon_cache = {}
+        headings = df['heading'].to_numpy()
+        keys = list(zip(
+            df['latitude'].round(5).tolist(), df['longitude'].round(5).tolist(),
+            np.where((headings >= 0) & (headings < 360), headings, 0).tolist(), lengths.tolist(), widths.tolist(),
+            df['dim_a'].tolist(), df['dim_b'].tolist(), df['dim_c'].tolist(), df['dim_d'].tolist()
+        ))
+        missing = list(dict.fromkeys(k for k in keys if k not in polygon_cache))
+        if missing:
+            if len(polygon_cache) + len(missing) > POLYGON_CACHE_MAX:
+                polygon_cache.clear()
+            polygon_cache.update(zip(missing, create_vessel_polygons(*zip(*missing)).tolist()))
+        # Calculate realistic 3D height based on actual vessel air draft (height above water)
+        # Typical cargo ships: 30-35m, Large container ships: 40-50m, Cruise ships: 60-75m
+        # Use vessel length as proxy: small (50m) = 20m tall, medium (150m) = 35m tall, large (300m+) = 50m tall
+        vessel_polygons = pd.DataFrame({
+            'polygon': [polygon_cache[k] for k in keys], 'name': df['name'].to_numpy(),
+            'tooltip': tooltips.to_numpy(), 'color': df['color'].to_numpy(),
+            'elevation': np.select([lengths < 100, lengths < 200], [20, 35], 50)
+        })
         layers.append(pdk.Layer(
             'PolygonLayer', data=vessel_polygons,
             get_polygon='polygon', get_fill_color='color',
@@ -881,17 +1277,27 @@ def create_zone_layer(zones: List[Dict], color: List[int], layer_id: str) -> pdk
         pickable=True, auto_highlight=True, extruded=False
     )
 
-def show_vessel_details_panel(imo: str, vessel_name: str, sp_username: str, sp_password: str):
-    """Display detailed vessel information including dark activity events"""
-    if not imo or imo == '0':
+def close_vessel_details_panel():
+    """Button callback - clears the panel selection before the fragment reruns"""
+    st.session_state.show_details_imo = None
+    st.session_state.show_details_name = None
+
+@st.fragment
+def show_vessel_details_panel(sp_username: str, sp_password: str):
+    """Display detailed vessel information including dark activity events
+
+    Runs as a fragment so closing the panel reruns only this section, not the map and table.
+    """
+    imo = st.session_state.get('show_details_imo')
+    if imo is None:
+        return
+    vessel_name = st.session_state.get('show_details_name', '')
+    if imo == '0':
         st.warning("⚠️ No IMO number available for this vessel.")
         return
     
     with st.expander(f"📋 Vessel Details: {vessel_name} (IMO: {imo})", expanded=True):
-        if st.button("❌ Close Details", key="close_details"):
-            st.session_state.show_details_imo = None
-            st.session_state.show_details_name = None
-            st.rerun()
+        st.button("❌ Close Details", key="close_details", on_click=close_vessel_details_panel)
         
         ships_api = SPShipsComplianceAPI(sp_username, sp_password)
         with st.spinner("🔍 Fetching vessel details..."):
@@ -952,75 +1358,95 @@ def show_vessel_details_panel(imo: str, vessel_name: str, sp_username: str, sp_p
         else:
             st.info("✅ No dark activity events recorded for this vessel.")
 
-def apply_filters(df: pd.DataFrame, selected_compliance, selected_sanctions, 
-                 selected_types, selected_nav_statuses) -> pd.DataFrame:
-    """Apply all filters to the dataframe"""
-    if len(df) == 0:
-        return df
-    filtered_df = df.copy()
+# Sanctions filter options and the compliance column each one checks
+SANCTION_FILTER_COLUMNS = {
+    "UN Sanctions": 'un_sanction', "OFAC Sanctions": 'ofac_sanction', "OFAC Non-SDN": 'ofac_non_sdn',
+    "OFAC Advisory": 'ofac_advisory', "Port Call (12m)": 'port_call_12m', "Dark Activity": 'dark_activity',
+    "STS Non-Compliance": 'sts_partner_non_compliance', "Flag Disputed": 'flag_disputed',
+    "Flag Sanctioned": 'flag_sanctioned', "Flag Hist Sanctioned": 'flag_sanctioned_historical',
+    "Security/Legal Dispute": 'security_legal_dispute'
+}
+
+def filter_mask(df: pd.DataFrame, selected_compliance, selected_sanctions,
+                selected_types, selected_nav_statuses) -> Optional[np.ndarray]:
+    """Composite row mask of all active filters, computed on df - None when no filter is active"""
+    masks = []
     
     if selected_compliance and "All" not in selected_compliance:
         compliance_map = {"Severe (🔴)": 2, "Warning (🟡)": 1, "Clear (🟢)": 0}
         selected_levels = [compliance_map[c] for c in selected_compliance if c in compliance_map]
         if selected_levels:
-            filtered_df = filtered_df[filtered_df['legal_overall'].isin(selected_levels)]
+            masks.append(df['legal_overall'].isin(selected_levels).to_numpy())
     
-    if selected_sanctions and "All" not in selected_sanctions:
-        sanction_mask = pd.Series([False] * len(filtered_df), index=filtered_df.index)
-        if "UN Sanctions" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['un_sanction'].isin([1, 2]))
-        if "OFAC Sanctions" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['ofac_sanction'].isin([1, 2]))
-        if "OFAC Non-SDN" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['ofac_non_sdn'].isin([1, 2]))
-        if "OFAC Advisory" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['ofac_advisory'].isin([1, 2]))
-        if "Port Call (12m)" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['port_call_12m'].isin([1, 2]))
-        if "Dark Activity" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['dark_activity'].isin([1, 2]))
-        if "STS Non-Compliance" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['sts_partner_non_compliance'].isin([1, 2]))
-        if "Flag Disputed" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['flag_disputed'].isin([1, 2]))
-        if "Flag Sanctioned" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['flag_sanctioned'].isin([1, 2]))
-        if "Flag Hist Sanctioned" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['flag_sanctioned_historical'].isin([1, 2]))
-        if "Security/Legal Dispute" in selected_sanctions:
-            sanction_mask = sanction_mask | (filtered_df['security_legal_dispute'].isin([1, 2]))
-        filtered_df = filtered_df[sanction_mask]
+    if selected_nav_statuses and "All" not in selected_nav_statuses:
+        masks.append(df['nav_status_name'].isin(selected_nav_statuses).to_numpy())
     
     if selected_types and "All" not in selected_types:
-        filtered_df = filtered_df[filtered_df['type_name'].isin(selected_types)]
+        masks.append(df['type_name'].isin(selected_types).to_numpy())
     
-    if selected_nav_statuses and "All" not in selected_nav_statuses:
-        filtered_df = filtered_df[filtered_df['nav_status_name'].isin(selected_nav_statuses)]
+    if selected_sanctions and "All" not in selected_sanctions:
+        # A vessel matches if any selected indicator is flagged (1 or 2) - one comparison over all columns
+        sanction_cols = [SANCTION_FILTER_COLUMNS[option] for option in selected_sanctions
+                         if option in SANCTION_FILTER_COLUMNS]
+        masks.append((df[sanction_cols].to_numpy() >= 1).any(axis=1))
     
-    return filtered_df
+    return np.logical_and.reduce(masks) if masks else None
+
+def apply_filters(df: pd.DataFrame, selected_compliance, selected_sanctions, 
+                 selected_types, selected_nav_statuses) -> pd.DataFrame:
+    """Apply all filters to the dataframe - every mask is computed on df, then it is sliced once"""
+    if len(df) == 0:
+        return df
+    mask = filter_mask(df, selected_compliance, selected_sanctions, selected_types, selected_nav_statuses)
+    return df if mask is None else df.iloc[mask]
+
+def compliance_emojis(levels: pd.Series) -> np.ndarray:
+    """Format a column of compliance levels with emoji"""
+    return COMPLIANCE_EMOJI_LUT[compliance_level_codes(levels)]
+
+# Vessel table headers and the dataframe columns they show, in display order
+VESSEL_TABLE_COLUMNS = {
+    'Name': 'name', 'IMO': 'imo', 'MMSI': 'mmsi', 'Type': 'type_name', 'Nav Status': 'nav_status_name',
+    'S&P Type': 'sp_ship_type', 'S&P Flag': 'sp_flag', 'S&P Status': 'sp_status',
+    'Legal': 'legal_overall', 'UN': 'un_sanction', 'OFAC': 'ofac_sanction', 'OFAC Non-SDN': 'ofac_non_sdn',
+    'OFAC Advisory': 'ofac_advisory', 'Port 12m': 'port_call_12m', 'Dark': 'dark_activity',
+    'STS': 'sts_partner_non_compliance', 'Flag Disp': 'flag_disputed', 'Flag Sanc': 'flag_sanctioned',
+    'Flag Hist': 'flag_sanctioned_historical', 'Security': 'security_legal_dispute',
+    'PSC Defects': 'psc_defects', 'PSC Detentions': 'psc_detentions'
+}
+# Table headers whose compliance levels are shown as emojis
+VESSEL_TABLE_LEVEL_HEADERS = ['Legal', 'UN', 'OFAC', 'OFAC Non-SDN', 'OFAC Advisory', 'Port 12m', 'Dark', 'STS',
+                              'Flag Disp', 'Flag Sanc', 'Flag Hist', 'Security']
 
-def format_compliance_value(val) -> str:
-    """Format compliance values with emoji"""
-    emoji_map = {2: "🔴", 1: "🟡", 0: "🟢"}
-    return emoji_map.get(val, "❓") if val is not None and val != -1 else "❓"
+# Columns that feed the vessel layers (positions, shapes and tooltips)
+LAYER_INPUT_COLUMNS = ['mmsi', 'name', 'imo', 'latitude', 'longitude', 'speed', 'heading',
+                       'nav_status_name', 'type_name', 'length', 'width', 'dim_a', 'dim_b', 'dim_c', 'dim_d',
+                       'has_dimensions', 'destination', 'last_seen', 'legal_overall']
 
+def dataframe_signature(df: pd.DataFrame, columns: List[str]) -> int:
+    """Cheap content fingerprint of the given dataframe columns"""
+    if len(df) == 0:
+        return 0
+    return int(pd.util.hash_pandas_object(df[columns], index=False).sum())
+
+@st.fragment
 def display_vessel_data(df: pd.DataFrame, last_update: str, vessel_display_mode: str, 
                        maritime_zones: Dict, show_anchorages: bool, show_channels: bool, 
                        show_fairways: bool, is_cached: bool = False):
-    """Display vessel data on map and table with persistent view"""
+    """Display vessel data on map and table with persistent view - a fragment, so selecting a table row
+    reruns only this section instead of reloading and filtering the vessel data again"""
     
     # Display statistics
     cols = st.columns(8)
     cols[0].metric("🚢 Total Ships", len(df))
-    cols[1].metric("⚡ Moving", len(df[df['speed'] > 1]) if len(df) > 0 else 0)
+    cols[1].metric("⚡ Moving", int((df['speed'].to_numpy() > 1).sum()) if len(df) > 0 else 0)
     cols[2].metric("📡 Has Static", int(df['has_static'].sum()) if len(df) > 0 else 0)
     
     if len(df) > 0:
         real_dims = int(df['has_dimensions'].sum())
-        severe_count = len(df[df['legal_overall'] == 2])
-        warning_count = len(df[df['legal_overall'] == 1])
-        clear_count = len(df[df['legal_overall'] == 0])
-        unknown_count = len(df[df['legal_overall'] < 0])
+        # One tally over legal_overall as level codes: unknown, clear, warning, severe
+        levels = compliance_level_codes(df['legal_overall'])
+        unknown_count, clear_count, warning_count, severe_count = np.bincount(levels, minlength=4).tolist()
     else:
         severe_count = warning_count = clear_count = unknown_count = real_dims = 0
     
@@ -1060,27 +1486,31 @@ def display_vessel_data(df: pd.DataFrame, last_update: str, vessel_display_mode:
         center_lon = st.session_state.map_center.get('lon', 103.85)
         zoom = st.session_state.map_center.get('zoom', user_zoom)
     
-    # Filter dataframe for map display - ALWAYS show all vessels
-    map_df = df.copy()
-    
-    # Create map layers
-    layers = []
-    if show_anchorages and maritime_zones['Anchorages']:
-        layer = create_zone_layer(maritime_zones['Anchorages'], [0, 255, 255, 50], "anchorages")
-        if layer:
-            layers.append(layer)
-    if show_channels and maritime_zones['Channels']:
-        layer = create_zone_layer(maritime_zones['Channels'], [255, 255, 0, 50], "channels")
-        if layer:
-            layers.append(layer)
-    if show_fairways and maritime_zones['Fairways']:
-        layer = create_zone_layer(maritime_zones['Fairways'], [255, 165, 0, 50], "fairways")
-        if layer:
-            layers.append(layer)
-    
-    vessel_layers = create_vessel_layers(map_df, zoom=zoom, display_mode=vessel_display_mode)
-    layers.extend(vessel_layers)
+    # Zone layers depend only on the checkboxes and the zones file, so each combination is built once
+    zone_key = (show_anchorages, show_channels, show_fairways,
+                tuple(len(maritime_zones[k]) for k in ("Anchorages", "Channels", "Fairways")))
+    if zone_key not in st.session_state.zone_layer_cache:
+        zone_specs = [
+            (show_anchorages, 'Anchorages', [0, 255, 255, 50], "anchorages"),
+            (show_channels, 'Channels', [255, 255, 0, 50], "channels"),
+            (show_fairways, 'Fairways', [255, 165, 0, 50], "fairways"),
+        ]
+        st.session_state.zone_layer_cache[zone_key] = [
+            create_zone_layer(maritime_zones[name], color, layer_id)
+            for shown, name, color, layer_id in zone_specs if shown and maritime_zones[name]
+        ]
     
+    # Reuse the previous run's vessel layers when only the view or the zones changed (e.g. a table row was selected);
+    # the map always shows all filtered vessels
+    vessel_inputs = (dataframe_signature(df, LAYER_INPUT_COLUMNS), vessel_display_mode)
+    if st.session_state.get('last_vessel_inputs') == vessel_inputs and 'last_vessel_layers' in st.session_state:
+        vessel_layers = st.session_state.last_vessel_layers
+    else:
+        vessel_layers = create_vessel_layers(df, zoom, vessel_display_mode, st.session_state.polygon_cache)
+        st.session_state.last_vessel_inputs = vessel_inputs
+        st.session_state.last_vessel_layers = vessel_layers
+    layers = st.session_state.zone_layer_cache[zone_key] + vessel_layers
+
     # Render map - use static key to maintain state across filter changes
     view_state = pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=zoom, pitch=0)
     deck = pdk.Deck(
@@ -1099,44 +1529,19 @@ def display_vessel_data(df: pd.DataFrame, last_update: str, vessel_display_mode:
         st.info("No vessels to display. Adjust filters or refresh data.")
     else:
         # Sort by legal_overall: default descending order (2, 1, 0, -1) from top to bottom
-        display_df = df.copy().sort_values(['legal_overall', 'name'], ascending=[False, True])
+        # then by name; np.lexsort takes the primary key last
+        order = np.lexsort((df['name'].to_numpy(dtype=str), -df['legal_overall'].to_numpy(dtype=np.int16)))
         
-        # Create display columns with emojis (simple, no sorting tricks)
-        display_df['legal_display'] = display_df['legal_overall'].apply(format_compliance_value)
-        display_df['un_display'] = display_df['un_sanction'].apply(format_compliance_value)
-        display_df['ofac_display'] = display_df['ofac_sanction'].apply(format_compliance_value)
-        display_df['ofac_non_sdn_display'] = display_df['ofac_non_sdn'].apply(format_compliance_value)
-        display_df['ofac_advisory_display'] = display_df['ofac_advisory'].apply(format_compliance_value)
-        display_df['port12m_display'] = display_df['port_call_12m'].apply(format_compliance_value)
-        display_df['dark_display'] = display_df['dark_activity'].apply(format_compliance_value)
-        display_df['sts_display'] = display_df['sts_partner_non_compliance'].apply(format_compliance_value)
-        display_df['flag_disp_display'] = display_df['flag_disputed'].apply(format_compliance_value)
-        display_df['flag_sanc_display'] = display_df['flag_sanctioned'].apply(format_compliance_value)
-        display_df['flag_hist_display'] = display_df['flag_sanctioned_historical'].apply(format_compliance_value)
-        display_df['security_display'] = display_df['security_legal_dispute'].apply(format_compliance_value)
-        
-        # Replace IMO '0' with blank for display
-        display_df['imo_display'] = display_df['imo'].apply(lambda x: '' if x == '0' or x == 0 else str(x))
+        # Build the table straight from the sorted source columns, without copying the whole dataframe;
+        # the fresh RangeIndex keeps iloc matching visual row numbers
+        table_df = pd.DataFrame({header: df[col].array.take(order) for header, col in VESSEL_TABLE_COLUMNS.items()})
         
-        # Create table with display columns only
-        table_df = display_df[[
-            'name', 'imo_display', 'mmsi', 'type_name', 'nav_status_name',
-            'sp_ship_type', 'sp_flag', 'sp_status',
-            'legal_display', 'un_display', 'ofac_display', 'ofac_non_sdn_display',
-            'ofac_advisory_display', 'port12m_display', 'dark_display', 'sts_display',
-            'flag_disp_display', 'flag_sanc_display', 'flag_hist_display', 'security_display',
-            'psc_defects', 'psc_detentions'
-        ]].copy().reset_index(drop=True)  # Reset index so iloc matches visual row numbers
+        # Create display columns with emojis - one array gather per column instead of a call per cell
+        for header in VESSEL_TABLE_LEVEL_HEADERS:
+            table_df[header] = compliance_emojis(table_df[header])
         
-        # Rename columns for display
-        table_df.columns = [
-            'Name', 'IMO', 'MMSI', 'Type', 'Nav Status',
-            'S&P Type', 'S&P Flag', 'S&P Status',
-            'Legal', 'UN', 'OFAC', 'OFAC Non-SDN',
-            'OFAC Advisory', 'Port 12m', 'Dark', 'STS',
-            'Flag Disp', 'Flag Sanc', 'Flag Hist', 'Security',
-            'PSC Defects', 'PSC Detentions'
-        ]
+        # Replace IMO '0' with blank for display
+        table_df['IMO'] = np.where(table_df['IMO'].isin(['0', 0]), '', table_df['IMO'].astype(str))
         
         # Configure columns
         column_config = {}
@@ -1193,6 +1598,73 @@ def display_cached_data(vessel_expiry_hours, vessel_display_mode, maritime_zones
     display_vessel_data(df, last_update, vessel_display_mode, maritime_zones, 
                        show_anchorages, show_channels, show_fairways, is_cached=True)
 
+def run_collection(tracker: AISTracker, duration: int, api_key: str, bounding_box: List, status_placeholder,
+                   sp_api: Optional[SPShipsComplianceAPI] = None, selected_types=None):
+    """Collect AIS data on a worker thread while this thread reports progress and the running vessel count.
+    With sp_api, compliance for IMOs in new static reports is requested while the stream is still open"""
+    stop_event = threading.Event()
+    errors = []
+    
+    def collect():
+        try:
+            asyncio.run(tracker.collect_data(duration, api_key, bounding_box, stop_event))
+        except Exception as e:
+            errors.append(e)
+    
+    # Only full 100-IMO batches are sent early - the remainder goes in the regular lookup after collection
+    screening = ThreadPoolExecutor(max_workers=SP_MAX_CONCURRENT_REQUESTS) if sp_api else None
+    screen_futures = []
+    queued_imos, pending_imos = set(), []
+    reports_seen = 0
+    type_filter = selected_types and "All" not in selected_types
+    
+    def screen_reported_imos():
+        nonlocal reports_seen
+        new_reports = tracker.reported_imos[reports_seen:]
+        reports_seen += len(new_reports)
+        cache = st.session_state.risk_data_cache
+        for imo, ship_type in new_reports:
+            if imo in queued_imos or (type_filter and get_vessel_type_category(ship_type) not in selected_types):
+                continue
+            queued_imos.add(imo)
+            if not sp_api.is_fresh(cache.get(imo)):
+                pending_imos.append(imo)
+        while len(pending_imos) >= 100:
+            screen_futures.append(screening.submit(sp_api.fetch_compliance_batch, pending_imos[:100]))
+            del pending_imos[:100]
+    
+    worker = threading.Thread(target=collect, daemon=True)
+    add_script_run_ctx(worker, get_script_run_ctx())  # The collector reads and saves session caches
+    start_time = time.time()
+    worker.start()
+    try:
+        while worker.is_alive():
+            progress = min((time.time() - start_time) / duration, 1.0)
+            status_placeholder.info(f'🔄 Collecting AIS data... {int(progress*100)}% ({len(tracker.mmsis)} vessels)')
+            if screening is not None:
+                screen_reported_imos()
+            worker.join(timeout=1)
+    except BaseException:
+        if screening is not None:
+            screening.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        # A Stop click or rerun interrupts the wait above - don't leave the collector running behind it
+        stop_event.set()
+        worker.join()
+    if screening is not None:
+        # Cache the early batches now, so the lookup that follows finds those IMOs fresh
+        screening.shutdown(wait=True)
+        screened = {}
+        for future in screen_futures:
+            try:
+                screened.update(future.result())
+            except Exception as e:
+                st.error(f"⚠️ S&P Ships API error: {str(e)}")
+        sp_api.store_compliance(screened)
+    if errors:
+        raise errors[0]
+
 def update_display(duration, ais_api_key, coverage_bbox, enable_compliance, sp_username, sp_password,
                   vessel_expiry_hours, vessel_display_mode, maritime_zones, show_anchorages, 
                   show_channels, show_fairways, selected_compliance, selected_sanctions, 
@@ -1205,36 +1677,35 @@ def update_display(duration, ais_api_key, coverage_bbox, enable_compliance, sp_u
     status_placeholder.info(f'🔄 Collecting AIS data... 0%')
     
     st.session_state.collection_duration = duration
-    st.session_state.collection_status_placeholder = status_placeholder
     
     # Collect data without spinner
     tracker = AISTracker(use_cached_positions=True)
     if ais_api_key:
         try:
-            asyncio.run(tracker.collect_data(duration, ais_api_key, coverage_bbox))
+            run_collection(tracker, duration, ais_api_key, coverage_bbox, status_placeholder,
+                           sp_api=sp_api, selected_types=selected_types)
         except Exception as e:
             st.session_state.collection_in_progress = False
-            if 'collection_status_placeholder' in st.session_state:
-                del st.session_state.collection_status_placeholder
             status_placeholder.error(f"⚠️ Error collecting AIS data: {e}")
             return
     else:
         st.session_state.collection_in_progress = False
-        if 'collection_status_placeholder' in st.session_state:
-            del st.session_state.collection_status_placeholder
         status_placeholder.warning("⚠️ No AISStream API key provided.")
         return
     
-    if 'collection_status_placeholder' in st.session_state:
-        del st.session_state.collection_status_placeholder
-    
     # get_dataframe_with_compliance will show its own detailed progress message with vessel count and percentage
-    df = tracker.get_dataframe_with_compliance(sp_api, expiry_hours=vessel_expiry_hours, status_placeholder=status_placeholder)
+    df = tracker.get_dataframe_with_compliance(sp_api, expiry_hours=vessel_expiry_hours, status_placeholder=status_placeholder,
+                                               bounding_box=coverage_bbox, selected_types=selected_types,
+                                               selected_nav_statuses=selected_nav_statuses)
     
     st.session_state.collection_in_progress = False
     
     if df.empty:
-        status_placeholder.warning("⚠️ No ships detected. Try increasing collection time or check API key.")
+        # Type/nav status filters are applied during the lookup, so an empty frame may only mean no matches
+        if any(selected and "All" not in selected for selected in (selected_types, selected_nav_statuses)):
+            status_placeholder.warning("⚠️ No vessels match filters. Adjust filters to see vessels.")
+        else:
+            status_placeholder.warning("⚠️ No ships detected. Try increasing collection time or check API key.")
         return
     
     df = apply_filters(df, selected_compliance, selected_sanctions, selected_types, 
@@ -1254,6 +1725,15 @@ def update_display(duration, ais_api_key, coverage_bbox, enable_compliance, sp_u
               st.session_state.get('mmsi_to_imo_cache', {}), st.session_state.get('vessel_positions', {}),
               st.session_state.get('psc_risk_cache', {}))
 
+@st.fragment(run_every=1)
+def show_refresh_countdown():
+    """Sidebar countdown - reruns on its own each second and starts a full rerun only when the refresh is due"""
+    elapsed = time.time() - st.session_state.last_refresh_time
+    remaining = max(0, st.session_state.refresh_interval - elapsed)
+    st.info(f"⏳ Next refresh in {int(remaining)}s")
+    if remaining <= 0 and not st.session_state.get('collection_in_progress', False):
+        st.rerun()
+
 # ============= STREAMLIT UI =============
 st.title("🚢 Singapore Ship Tracker")
 st.markdown("Real-time vessel tracking with compliance screening and risk indicators")
@@ -1325,9 +1805,12 @@ excel_paths = ["/mnt/project/Anchorages_Channels_Fairways_Details.xlsx",
                "Anchorages_Channels_Fairways_Details.xlsx"]
 if show_anchorages or show_channels or show_fairways:
     for path in excel_paths:
-        if os.path.exists(path):
-            maritime_zones = load_maritime_zones(path)
-            break
+        try:
+            mtime = os.path.getmtime(path)  # One stat doubles as the existence check
+        except OSError:
+            continue
+        maritime_zones = load_maritime_zones(path, mtime)
+        break
 
 st.sidebar.header("🔍 Filters")
 st.sidebar.subheader("Quick Filters")
@@ -1380,7 +1863,7 @@ selected_sanctions = st.sidebar.multiselect("Compliance Indicators (Severe/Warni
                                             key="sanctions_filter", disabled=collection_active)
 
 st.sidebar.subheader("Vessel Type")
-vessel_types = ["All", "Cargo", "Tanker", "Passenger", "Tug", "Fishing", "High Speed Craft", "Pilot", "SAR", "Port Tender", "Law Enforcement", "Other", "Unknown"]
+vessel_types = ["All"] + VESSEL_TYPE_CATEGORY_NAMES
 selected_types = st.sidebar.multiselect("Types", vessel_types, 
                                        default=st.session_state.get('types_filter', default_types),
                                        key="types_filter", disabled=collection_active)
@@ -1411,7 +1894,7 @@ if st.sidebar.button("🗑️ Clear All Cache"):
     st.session_state.mmsi_to_imo_cache = {}
     st.session_state.vessel_positions = {}
     st.session_state.last_data_update = None
-    save_cache({}, {}, {}, {}, {})
+    save_cache({}, {}, {}, {}, {}, force=True)
     st.sidebar.success("Cache cleared!")
     st.rerun()
 
@@ -1427,16 +1910,9 @@ if auto_refresh:
     st.session_state.refresh_interval = refresh_options[selected_interval]
     
     if 'last_refresh_time' in st.session_state:
-        elapsed = time.time() - st.session_state.last_refresh_time
-        remaining = max(0, st.session_state.refresh_interval - elapsed)
-        st.sidebar.info(f"⏳ Next refresh in {int(remaining)}s")
-        # Only rerun every 5 seconds to update countdown, not every second
-        if remaining > 5:
-            time.sleep(5)
-            st.rerun()
-        elif remaining > 0:
-            time.sleep(remaining)
-            st.rerun()
+        # Ticks in a fragment, so the map and table below are rendered once instead of on every tick
+        with st.sidebar:
+            show_refresh_countdown()
 
 # Legend (place before buttons so it always displays)
 st.sidebar.markdown("---")
@@ -1530,9 +2006,7 @@ else:
             displayed_in_this_run = True
 
 if st.session_state.get('show_details_imo') and sp_username and sp_password:
-    show_vessel_details_panel(st.session_state.show_details_imo, 
-                            st.session_state.get('show_details_name', ''),
-                            sp_username, sp_password)
+    show_vessel_details_panel(sp_username, sp_password)
 
 # Auto-display cached data on initial load or when filters change
 if not displayed_in_this_run and not st.session_state.get('collection_in_progress', False):